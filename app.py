@@ -3,16 +3,54 @@
 Веб-сайт с кейсами, формой обратной связи и админ-панелью
 """
 import os
+import csv
+import hmac
+import io
+import json
 import logging
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import mimetypes
+import re
+import sqlite3
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from functools import wraps
+from pathlib import Path
+from flask import (
+    Flask, Response, g, render_template, request, redirect, send_from_directory, session, url_for, flash, jsonify,
+    stream_with_context,
+)
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, case, func, insert, or_
+from sqlalchemy import event as sa_event
 from wtforms import StringField, TextAreaField, EmailField, TelField, SelectField, SubmitField
 from wtforms.validators import DataRequired, Email, Length
+from werkzeug.exceptions import NotFound
 from flask_wtf import FlaskForm, CSRFProtect
 from config import Config
-from backend.rag_index import generate_answer as rag_generate_answer
+from backend.admission import Admission, Overloaded
+from backend.assets import AssetManifest
+from backend.contact_writer import ContactWriter, QueueFull
+from backend.page_cache import PageCache
+from backend.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    CallbackMetric,
+    Histogram,
+    render_metrics,
+    server_timing_header,
+    start_request_timing,
+)
+# Фасад импортирует backend.rag_index (faiss, numpy, openai) только при первом обращении к чату
+from backend.chatbot import (
+    generate_answer as rag_generate_answer,
+    generate_answers as rag_generate_answers,
+    stream_answer as rag_stream_answer,
+    reload_index as rag_reload_index,
+    start_prewarm as rag_start_prewarm,
+    start_reloader as rag_start_reloader,
+    status as rag_status,
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,6 +62,9 @@ logger = logging.getLogger(__name__)
 # Инициализация Flask приложения
 app = Flask(__name__)
 app.config.from_object(Config)
+# SQLite в памяти работает через StaticPool, которому настройки размера пула не подходят
+if app.config['SQLALCHEMY_DATABASE_URI'] in ('sqlite://', 'sqlite:///:memory:'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
 
 # Инициализация расширений
 db = SQLAlchemy(app)
@@ -33,6 +74,44 @@ login_manager.init_app(app)
 login_manager.login_view = 'admin_login'
 login_manager.login_message = 'Пожалуйста, войдите в систему для доступа к этой странице.'
 login_manager.login_message_category = 'info'
+chat_admission = Admission(
+    app.config['CHAT_MAX_CONCURRENT'],
+    app.config['CHAT_MAX_QUEUE'],
+    queue_timeout=app.config['CHAT_QUEUE_TIMEOUT'],
+    retry_after=app.config['CHAT_RETRY_AFTER'],
+)
+HTTP_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Время обработки запросов по маршрутам',
+    ['endpoint', 'method', 'status'],
+)
+
+
+def sqlite_casefold(value):
+    """casefold() для SQL: встроенные lower()/LIKE в SQLite не учитывают регистр только для ASCII"""
+    return value.casefold() if isinstance(value, str) else value
+
+
+def configure_sqlite(dbapi_connection, connection_record):
+    """
+    WAL: чтение не блокируется записью; busy_timeout: запись ждёт блокировку, а не падает сразу.
+    synchronous=NORMAL в режиме WAL не теряет согласованность при падении процесса.
+    Функция casefold() нужна поиску заявок без учёта регистра кириллицы
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    dbapi_connection.create_function('casefold', 1, sqlite_casefold, deterministic=True)
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT']}")
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+# Только для движка приложения: другие движки в процессе (тесты, скрипты) настраиваются сами
+with app.app_context():
+    sa_event.listen(db.engine, 'connect', configure_sqlite)
+
 
 # Модели базы данных
 class Contact(db.Model):
@@ -45,6 +124,12 @@ class Contact(db.Model):
     message = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
+
+    # Индексы под сортировку админки (created_at, id) и фильтр непрочитанных
+    __table_args__ = (
+        db.Index('ix_contact_created_at_id', 'created_at', 'id'),
+        db.Index('ix_contact_is_read_created_at_id', 'is_read', 'created_at', 'id'),
+    )
     
     def __repr__(self):
         return f'<Contact {self.name} - {self.subject}>'
@@ -75,6 +160,16 @@ def load_user(user_id):
     return None
 
 # Формы
+# Темы заявок: значение в БД и подпись
+SUBJECT_CHOICES = [
+    ('telegram_bot', 'Разработка Telegram-бота'),
+    ('online_store', 'Создание интернет-магазина'),
+    ('crm_automation', 'Автоматизация CRM'),
+    ('corporate_site', 'Разработка корпоративного сайта'),
+    ('ai_assistant', 'AI-ассистент для поддержки клиентов'),
+    ('other', 'Другое'),
+]
+
 class ContactForm(FlaskForm):
     """Форма обратной связи"""
     name = StringField('Имя', validators=[DataRequired(message='Поле обязательно для заполнения'), 
@@ -83,15 +178,7 @@ class ContactForm(FlaskForm):
                                             Email(message='Введите корректный email адрес')])
     phone = TelField('Телефон', validators=[DataRequired(message='Поле обязательно для заполнения')])
     subject = SelectField('Тема сообщения', 
-                         choices=[
-                             ('', 'Выберите тему'),
-                             ('telegram_bot', 'Разработка Telegram-бота'),
-                             ('online_store', 'Создание интернет-магазина'),
-                             ('crm_automation', 'Автоматизация CRM'),
-                             ('corporate_site', 'Разработка корпоративного сайта'),
-                             ('ai_assistant', 'AI-ассистент для поддержки клиентов'),
-                             ('other', 'Другое')
-                         ],
+                         choices=[('', 'Выберите тему')] + SUBJECT_CHOICES,
                          validators=[DataRequired(message='Выберите тему сообщения')],
                          default='')
     message = TextAreaField('Сообщение', validators=[DataRequired(message='Поле обязательно для заполнения'),
@@ -243,20 +330,113 @@ CASES_DATA = {
     }
 }
 
+# Собранная статика: python -m backend.assets build
+asset_manifest = AssetManifest()
+
+
+@app.template_global()
+def asset_url(filename):
+    """URL статического файла: собранная версия с хешем в имени, если сборка есть"""
+    return url_for('static', filename=asset_manifest.get(filename) or filename)
+
+
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    """Собранный файл: заранее сжатый вариант по Accept-Encoding и кеширование без перепроверки"""
+    dist_dir = Path(app.static_folder) / 'dist'
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if not request.accept_encodings[encoding]:
+            continue
+        try:
+            response = send_from_directory(dist_dir, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+        except NotFound:
+            continue
+        response.headers['Content-Encoding'] = encoding
+        break
+    if response is None:
+        response = send_from_directory(dist_dir, filename)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f"public, max-age={app.config['ASSETS_MAX_AGE']}, immutable"
+    return response
+
+
 # Роуты для основных страниц
+page_cache = PageCache(
+    app.config['PAGE_CACHE_SIZE'],
+    # Пересборка статики меняет ссылки в страницах
+    watch_paths=[Path(app.root_path) / app.template_folder, asset_manifest.path],
+    data=lambda: CASES_DATA,
+)
+
+CallbackMetric(
+    'page_cache_lookups_total',
+    'Обращения к кешу отрендеренных страниц',
+    lambda: {(result,): page_cache.stats()[key] for result, key in (('hit', 'hits'), ('miss', 'misses'))},
+    ['result'],
+    kind='counter',
+)
+
+
+def page_response(page):
+    """Ответ из кеша: лучший поддерживаемый клиентом вариант сжатия или 304 по ETag"""
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in page.variants and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    body, etag = page.variants[encoding]
+
+    if any(request.if_none_match.contains_weak(tag) for tag in page.etags()):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=page.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    max_age = app.config['PAGE_CACHE_MAX_AGE']
+    response.headers['Cache-Control'] = f'public, max-age={max_age}' if max_age else 'no-cache'
+    return response
+
+
+def cached_page(view):
+    """
+    Кеширует отрендеренную страницу по маршруту и его аргументам.
+    Страницы с flash-сообщениями рендерятся заново и не кешируются.
+    """
+    @wraps(view)
+    def wrapper(**kwargs):
+        if not app.config['PAGE_CACHE_ENABLED'] or session.get('_flashes'):
+            return view(**kwargs)
+
+        key = (request.endpoint, tuple(sorted(kwargs.items())))
+        page = page_cache.get(key)
+        if page is None:
+            response = app.make_response(view(**kwargs))
+            if response.status_code != 200:
+                return response
+            page = page_cache.put(key, response.get_data(), response.mimetype)
+        return page_response(page)
+    return wrapper
+
+
 @app.route('/')
+@cached_page
 def index():
     """Главная страница"""
     logger.info('Главная страница запрошена')
     return render_template('index.html', cases=CASES_DATA)
 
 @app.route('/cases')
+@cached_page
 def cases():
     """Страница со всеми кейсами"""
     logger.info('Страница кейсов запрошена')
     return render_template('cases.html', cases=CASES_DATA)
 
 @app.route('/case/<case_id>')
+@cached_page
 def case_detail(case_id):
     """Страница с детальным описанием кейса"""
     case = CASES_DATA.get(case_id)
@@ -272,21 +452,27 @@ def contact():
     form = ContactForm()
     
     if form.validate_on_submit():
+        record = {
+            'name': form.name.data,
+            'email': form.email.data,
+            'phone': form.phone.data,
+            'subject': form.subject.data,
+            'message': form.message.data,
+        }
         try:
-            # Создание новой заявки
-            contact = Contact(
-                name=form.name.data,
-                email=form.email.data,
-                phone=form.phone.data,
-                subject=form.subject.data,
-                message=form.message.data
-            )
-            db.session.add(contact)
-            db.session.commit()
-            
-            logger.info(f'Новая заявка создана: {contact.name} - {contact.subject}')
+            if app.config['CONTACT_WRITE_BEHIND']:
+                # Заявка записывается в БД фоновым потоком вместе с соседними
+                contact_writer.submit({**record, 'created_at': datetime.utcnow().isoformat()})
+            else:
+                db.session.add(Contact(**record))
+                db.session.commit()
+
+            logger.info(f"Новая заявка принята: {record['name']} - {record['subject']}")
             flash('Спасибо! Ваше сообщение успешно отправлено. Мы свяжемся с вами в ближайшее время.', 'success')
             return redirect(url_for('contact'))
+        except QueueFull:
+            logger.error('Заявка отклонена: очередь записи заполнена')
+            flash('Произошла ошибка при отправке сообщения. Попробуйте позже.', 'error')
         except Exception as e:
             db.session.rollback()
             logger.error(f'Ошибка при создании заявки: {str(e)}')
@@ -294,6 +480,37 @@ def contact():
     
     return render_template('contact.html', form=form)
 
+
+def insert_contacts(records):
+    """Пакетная запись заявок из очереди: один многострочный INSERT в одной транзакции"""
+    rows = [{**record, 'created_at': datetime.fromisoformat(record['created_at'])} for record in records]
+    with app.app_context():
+        db.session.execute(insert(Contact), rows)
+        db.session.commit()
+
+
+contact_writer = ContactWriter(
+    insert_contacts,
+    max_queue=app.config['CONTACT_QUEUE_SIZE'],
+    batch_size=app.config['CONTACT_BATCH_SIZE'],
+    spool_dir=(app.config['CONTACT_SPOOL_DIR'] or os.path.join(app.instance_path, 'contact_spool'))
+    if app.config['CONTACT_SPOOL'] else None,
+    fsync=app.config['CONTACT_SPOOL_FSYNC'],
+)
+
+CallbackMetric(
+    'contact_writer_pending',
+    'Заявки в очереди на запись в БД',
+    lambda: {(): contact_writer.stats()['pending']},
+)
+CallbackMetric(
+    'contact_writer_rows_total',
+    'Заявки из очереди: записанные и отклонённые из-за переполнения',
+    lambda: {(result,): contact_writer.stats()[result] for result in ('written', 'rejected')},
+    ['result'],
+    kind='counter',
+)
+
 # Роуты для админ-панели
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -329,19 +546,189 @@ def admin_logout():
     flash('Вы вышли из системы', 'info')
     return redirect(url_for('admin_login'))
 
+def contact_filters_from_args(args):
+    """Фильтры списка заявок из параметров запроса: статус, тема и текстовый поиск"""
+    status = args.get('status', 'all')
+    subject = args.get('subject', '')
+    search = (args.get('q') or '').strip()
+    return {
+        'status': status if status in ('all', 'unread', 'read') else 'all',
+        'subject': subject if subject in dict(SUBJECT_CHOICES) else '',
+        'q': search[:100],
+    }
+
+
+def filtered_contacts(filters):
+    """Запрос заявок с применёнными фильтрами (без сортировки)"""
+    query = Contact.query
+    if filters['status'] == 'unread':
+        query = query.filter(Contact.is_read.is_(False))
+    elif filters['status'] == 'read':
+        query = query.filter(Contact.is_read.is_(True))
+    if filters['subject']:
+        query = query.filter(Contact.subject == filters['subject'])
+    if filters['q']:
+        query = query.filter(or_(*(
+            contains_casefold(column, filters['q'])
+            for column in (Contact.name, Contact.email, Contact.message)
+        )))
+    return query
+
+
+def contains_casefold(column, text):
+    """Подстрока без учёта регистра, в том числе для кириллицы"""
+    pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    if db.engine.dialect.name == 'sqlite':
+        # ILIKE в SQLite сводится к lower(), который не знает регистр кириллицы
+        return func.casefold(column).like(sqlite_casefold(pattern), escape='\\')
+    return column.ilike(pattern, escape='\\')
+
+
+def encode_cursor(contact):
+    return f'{contact.created_at.isoformat()}_{contact.id}'
+
+
+def decode_cursor(cursor):
+    """Курсор страницы: (created_at, id) последней/первой показанной заявки или None"""
+    try:
+        created_at, contact_id = (cursor or '').rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(contact_id)
+    except ValueError:
+        return None
+
+
+def contacts_page(query, before=None, after=None, page_size=50):
+    """
+    Keyset-пагинация по (created_at, id) от новых к старым.
+    before — курсор для следующей (более старой) страницы, after — для предыдущей.
+    Возвращает (заявки, есть_новее, есть_старее); стоимость не зависит от номера страницы.
+    """
+    if after:
+        created_at, contact_id = after
+        rows = query.filter(or_(
+            Contact.created_at > created_at,
+            and_(Contact.created_at == created_at, Contact.id > contact_id),
+        )).order_by(Contact.created_at.asc(), Contact.id.asc()).limit(page_size + 1).all()
+        has_newer = len(rows) > page_size
+        return list(reversed(rows[:page_size])), has_newer, True
+
+    if before:
+        created_at, contact_id = before
+        query = query.filter(or_(
+            Contact.created_at < created_at,
+            and_(Contact.created_at == created_at, Contact.id < contact_id),
+        ))
+    rows = query.order_by(Contact.created_at.desc(), Contact.id.desc()).limit(page_size + 1).all()
+    return rows[:page_size], before is not None, len(rows) > page_size
+
+
+def contact_counts():
+    """Всего и непрочитанных заявок одним агрегирующим запросом"""
+    total, unread = db.session.query(
+        func.count(Contact.id),
+        func.coalesce(func.sum(case((Contact.is_read.is_(False), 1), else_=0)), 0),
+    ).one()
+    return total, unread
+
+
 @app.route('/admin/dashboard')
 @login_required
 def admin_dashboard():
     """Главная страница админ-панели"""
-    contacts = Contact.query.order_by(Contact.created_at.desc()).all()
-    unread_count = Contact.query.filter_by(is_read=False).count()
-    total_count = Contact.query.count()
+    filters = contact_filters_from_args(request.args)
+    contacts, has_newer, has_older = contacts_page(
+        filtered_contacts(filters),
+        before=decode_cursor(request.args.get('before')),
+        after=decode_cursor(request.args.get('after')),
+        page_size=app.config['ADMIN_PAGE_SIZE'],
+    )
+    total_count, unread_count = contact_counts()
     
     logger.info('Админ-панель запрошена')
     return render_template('admin/dashboard.html', 
                          contacts=contacts, 
                          unread_count=unread_count,
-                         total_count=total_count)
+                         total_count=total_count,
+                         filters=filters,
+                         subject_choices=SUBJECT_CHOICES,
+                         newer_cursor=encode_cursor(contacts[0]) if contacts and has_newer else None,
+                         older_cursor=encode_cursor(contacts[-1]) if contacts and has_older else None)
+
+EXPORT_FIELDS = ['id', 'name', 'email', 'phone', 'subject', 'message', 'created_at', 'is_read']
+
+
+def parse_date_arg(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def csv_safe(value):
+    """Экранирует значения, которые Excel выполнил бы как формулу (телефоны вида +7... не трогаем)"""
+    if (
+        isinstance(value, str)
+        and value[:1] in ('=', '+', '-', '@', '\t', '\r')
+        and not re.fullmatch(r'[+\-]?[\d\s().\-]+', value)
+    ):
+        return "'" + value
+    return value
+
+
+def export_csv(query):
+    """CSV-выгрузка: строки читаются из БД порциями и отдаются клиенту кусками"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл UTF-8 с кириллицей без искажений
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for count, contact in enumerate(query.yield_per(app.config['EXPORT_BATCH_SIZE']), 1):
+        row = contact.to_dict()
+        writer.writerow([csv_safe(row[field]) for field in EXPORT_FIELDS])
+        if count % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(query):
+    """NDJSON-выгрузка: по одному JSON-объекту на строку"""
+    for contact in query.yield_per(app.config['EXPORT_BATCH_SIZE']):
+        yield json.dumps(contact.to_dict(), ensure_ascii=False) + '\n'
+
+
+@app.route('/admin/contacts/export')
+@login_required
+def export_contacts():
+    """Потоковая выгрузка заявок в CSV или NDJSON с фильтрами дашборда и диапазоном дат"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Поддерживаются форматы csv и ndjson'}), 400
+
+    query = filtered_contacts(contact_filters_from_args(request.args))
+    date_from = parse_date_arg(request.args.get('from'))
+    date_to = parse_date_arg(request.args.get('to'))
+    if date_from:
+        query = query.filter(Contact.created_at >= date_from)
+    if date_to:
+        # Дата «по» включительно
+        query = query.filter(Contact.created_at < date_to + timedelta(days=1))
+    query = query.order_by(Contact.created_at.asc(), Contact.id.asc())
+
+    filename = f"contacts-{datetime.utcnow().strftime('%Y%m%d-%H%M')}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    logger.info(f'Экспорт заявок ({fmt}) запрошен администратором')
+    rows = export_csv(query) if fmt == 'csv' else export_ndjson(query)
+    response = Response(stream_with_context(rows), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @app.route('/admin/contact/<int:contact_id>/read', methods=['POST'])
 @login_required
@@ -364,12 +751,88 @@ def delete_contact(contact_id):
     flash('Заявка успешно удалена', 'success')
     return redirect(url_for('admin_dashboard'))
 
+BULK_MAX_IDS = 1000
 
-@app.route('/chat', methods=['POST'])
-@csrf.exempt
-def chat():
-    """API-эндпоинт для RAG-чатбота на главной странице."""
-    data = request.get_json(silent=True) or {}
+
+def bulk_contacts_query(payload, require_criteria=False):
+    """
+    Заявки для массового действия: {"ids": [...]} или {"filter": {...}} с ключами
+    status, subject, q и older_than_days. Возвращает (запрос, ошибка).
+    """
+    payload = payload if isinstance(payload, dict) else {}
+    if 'ids' in payload:
+        ids = payload['ids']
+        if not isinstance(ids, list) or not ids or len(ids) > BULK_MAX_IDS:
+            return None, f'Нужен непустой список ids (не больше {BULK_MAX_IDS})'
+        try:
+            ids = [int(contact_id) for contact_id in ids]
+        except (TypeError, ValueError):
+            return None, 'ids должны быть числами'
+        return Contact.query.filter(Contact.id.in_(ids)), None
+
+    raw = payload.get('filter')
+    if not isinstance(raw, dict):
+        return None, 'Укажите ids или filter'
+    filters = contact_filters_from_args(raw)
+    query = filtered_contacts(filters)
+    older_than_days = raw.get('older_than_days')
+    if older_than_days not in (None, ''):
+        try:
+            older_than_days = int(older_than_days)
+        except (TypeError, ValueError):
+            return None, 'older_than_days должно быть числом'
+        query = query.filter(Contact.created_at < datetime.utcnow() - timedelta(days=older_than_days))
+    has_criteria = filters['status'] != 'all' or filters['subject'] or filters['q'] or older_than_days not in (None, '')
+    if require_criteria and not has_criteria:
+        return None, 'Для удаления по фильтру задайте хотя бы одно условие'
+    return query, None
+
+
+@app.route('/admin/contacts/bulk/read', methods=['POST'])
+@login_required
+def bulk_mark_as_read():
+    """Отметить прочитанными выбранные или все подходящие под фильтр заявки одним UPDATE"""
+    query, error = bulk_contacts_query(request.get_json(silent=True))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    affected = query.filter(Contact.is_read.is_(False)).update(
+        {Contact.is_read: True}, synchronize_session=False
+    )
+    db.session.commit()
+    logger.info(f'Массово отмечено прочитанными заявок: {affected}')
+    return jsonify({'success': True, 'affected': affected})
+
+
+@app.route('/admin/contacts/bulk/delete', methods=['POST'])
+@login_required
+def bulk_delete_contacts():
+    """Удалить выбранные или все подходящие под фильтр заявки одним DELETE"""
+    query, error = bulk_contacts_query(request.get_json(silent=True), require_criteria=True)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    affected = query.delete(synchronize_session=False)
+    db.session.commit()
+    logger.info(f'Массово удалено заявок: {affected}')
+    return jsonify({'success': True, 'affected': affected})
+
+
+@app.route('/admin/rag/reload', methods=['POST'])
+@login_required
+def admin_rag_reload():
+    """Перезагрузить базу знаний чат-бота без перезапуска приложения"""
+    force_rebuild = request.args.get('rebuild') == '1'
+    try:
+        result = rag_reload_index(force_rebuild=force_rebuild)
+        logger.info(f'Индекс чат-бота перезагружен администратором: {result}')
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        logger.exception(f'Ошибка перезагрузки индекса чат-бота: {e}')
+        return jsonify({'success': False, 'error': 'Не удалось перезагрузить индекс'}), 500
+
+
+def parse_chat_payload(data):
+    """Извлекает сообщение и top_k из JSON-тела запроса к чат-боту"""
+    data = data if isinstance(data, dict) else {}
     message = (data.get('message') or '').strip()
     top_k = data.get('top_k') or 3
 
@@ -378,36 +841,198 @@ def chat():
     except (TypeError, ValueError):
         top_k = 3
 
+    return message, top_k
+
+
+def sse_event(event, data):
+    """Форматирует одно событие Server-Sent Events"""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+@app.route('/chat', methods=['POST'])
+@csrf.exempt
+def chat():
+    """API-эндпоинт для RAG-чатбота на главной странице."""
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return chat_stream()
+
+    message, top_k = parse_chat_payload(request.get_json(silent=True))
+
     if not message:
         return jsonify({'error': 'Пустое сообщение'}), 400
 
-    try:
-        result = rag_generate_answer(message, top_k=top_k)
-        logger.info('Чат-бот обработал сообщение пользователя')
-        return jsonify(result)
-    except Exception as e:
-        logger.exception(f'Ошибка RAG-чатбота: {e}')
-        return jsonify({'error': 'Ошибка при обработке запроса чат-бота'}), 500
+    with chat_admission.slot():
+        try:
+            result = rag_generate_answer(message, top_k=top_k)
+            logger.info('Чат-бот обработал сообщение пользователя')
+            return jsonify(result)
+        except Exception as e:
+            logger.exception(f'Ошибка RAG-чатбота: {e}')
+            return jsonify({'error': 'Ошибка при обработке запроса чат-бота'}), 500
+
+
+@app.route('/chat/stream', methods=['POST'])
+@csrf.exempt
+def chat_stream():
+    """Потоковый API чат-бота: контекст и токены ответа отдаются через SSE."""
+    message, top_k = parse_chat_payload(request.get_json(silent=True))
+
+    if not message:
+        return jsonify({'error': 'Пустое сообщение'}), 400
+
+    # Слот держится до закрытия ответа, а не до выхода из view-функции
+    slot = ExitStack()
+    slot.enter_context(chat_admission.slot())
+
+    def generate():
+        try:
+            for event, data in rag_stream_answer(message, top_k=top_k):
+                yield sse_event(event, data)
+            logger.info('Чат-бот обработал сообщение пользователя (stream)')
+        except Exception as e:
+            logger.exception(f'Ошибка RAG-чатбота: {e}')
+            yield sse_event('error', {'error': 'Ошибка при обработке запроса чат-бота'})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx, иначе токены придут одним куском
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(slot.close)
+    return response
+
+@app.route('/chat/batch', methods=['POST'])
+@csrf.exempt
+def chat_batch():
+    """
+    Пакетный API чат-бота для интеграций: {"messages": [str, ...], "top_k": int}.
+    Ответы возвращаются в том же порядке; ошибка одного вопроса не прерывает остальные.
+    """
+    data = request.get_json(silent=True)
+    messages = data.get('messages') if isinstance(data, dict) else None
+    if not isinstance(messages, list) or not messages:
+        return jsonify({'error': 'Ожидается непустой список messages'}), 400
+    if len(messages) > app.config['CHAT_BATCH_MAX_SIZE']:
+        return jsonify({'error': f"Не больше {app.config['CHAT_BATCH_MAX_SIZE']} сообщений в одном запросе"}), 400
+    _, top_k = parse_chat_payload(data)
+
+    texts = [item.strip() if isinstance(item, str) else '' for item in messages]
+    valid = [i for i, text in enumerate(texts) if text]
+    results = [{'error': 'Пустое сообщение'} for _ in texts]
+
+    if valid:
+        # Каждое параллельное обращение к LLM занимает свой слот лимита CHAT_MAX_CONCURRENT
+        wanted = min(len(valid), app.config['RAG_BATCH_CONCURRENCY'])
+        with chat_admission.slots(wanted) as concurrency:
+            try:
+                answers = rag_generate_answers([texts[i] for i in valid], top_k=top_k, concurrency=concurrency)
+            except Exception as e:
+                logger.exception(f'Ошибка RAG-чатбота: {e}')
+                return jsonify({'error': 'Ошибка при обработке запроса чат-бота'}), 500
+        for i, answer in zip(valid, answers):
+            results[i] = answer
+        logger.info(f'Чат-бот обработал пакет из {len(valid)} сообщений')
+    return jsonify({'results': results})
+
+
+@app.route('/chat/ready')
+def chat_ready():
+    """Готовность чат-бота: 200, когда индекс загружен, иначе 503 (для проверок балансировщика)"""
+    status = rag_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 
 # Инициализация базы данных
 def init_db():
     """Создание таблиц базы данных"""
     with app.app_context():
         db.create_all()
+        # create_all не добавляет индексы в уже существующие таблицы
+        for index in Contact.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
         logger.info('База данных инициализирована')
 
+@app.before_request
+def start_request_timer():
+    """Засекает время запроса и включает сбор этапов для Server-Timing"""
+    g.request_started = time.perf_counter()
+    if app.config['SERVER_TIMING']:
+        start_request_timing()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Время запроса по маршруту; для потоковых ответов — до отправки заголовков"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    HTTP_SECONDS.observe(
+        elapsed,
+        endpoint=request.endpoint or 'unknown',
+        method=request.method,
+        status=response.status_code,
+    )
+    if app.config['SERVER_TIMING']:
+        stages = server_timing_header()
+        total = f'total;dur={elapsed * 1000:.1f}'
+        response.headers['Server-Timing'] = f'{stages}, {total}' if stages else total
+    return response
+
+
+@app.route('/metrics')
+@csrf.exempt
+def metrics():
+    """Метрики приложения и чат-бота в формате Prometheus"""
+    if not app.config['METRICS_ENABLED']:
+        return render_template('errors/404.html'), 404
+    if not metrics_authorized():
+        return Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, content_type='text/plain')
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
+def metrics_authorized():
+    """Доступ к /metrics: сессия администратора или токен METRICS_TOKEN для Prometheus"""
+    if current_user.is_authenticated:
+        return True
+    token = app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
 # Обработчик ошибок
 @app.errorhandler(404)
 def not_found_error(error):
     """Обработка ошибки 404"""
     return render_template('errors/404.html'), 404
 
+@app.errorhandler(Overloaded)
+def overloaded_error(error):
+    """Чат-бот перегружен: лимит одновременных запросов и очередь заполнены"""
+    logger.warning('Запрос к чат-боту отклонён: превышен лимит одновременных запросов')
+    response = jsonify({'error': 'Чат-бот сейчас перегружен, попробуйте через несколько секунд'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @app.errorhandler(500)
 def internal_error(error):
     """Обработка ошибки 500"""
     db.session.rollback()
     return render_template('errors/500.html'), 500
 
+# Фоновая запись заявок; при старте дописывает заявки из журналов упавших процессов.
+# При загрузке в мастере gunicorn поток запускает wsgi.after_fork() уже в воркере
+if app.config['CONTACT_WRITE_BEHIND'] and not app.config['DEFER_BACKGROUND_THREADS']:
+    contact_writer.start()
+
+# Фоновая перезагрузка индекса чат-бота при изменении faqs.json
+if app.config['RAG_RELOAD_INTERVAL'] > 0:
+    rag_start_reloader(app.config['RAG_RELOAD_INTERVAL'])
+
+# Загрузка индекса чат-бота в фоне при старте, чтобы первый запрос к чату её не ждал
+if app.config['RAG_PREWARM'] and not app.config['DEFER_BACKGROUND_THREADS']:
+    rag_start_prewarm()
+
 if __name__ == '__main__':
     # Создание таблиц при запуске
     init_db()
@@ -0,0 +1,181 @@
+"""
+ASGI-точка входа приложения.
+
+/chat и /chat/stream обрабатываются асинхронно на AsyncOpenAI: ожидание ответа
+модели не занимает поток, поэтому даже при перегрузке чат-бота обычные
+страницы продолжают отвечать. Остальные маршруты отдаются Flask-приложению
+через WSGI-адаптер в пуле потоков.
+
+Запуск:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+"""
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from app import HTTP_SECONDS, app as flask_app, parse_chat_payload, sse_event
+from backend.admission import AsyncAdmission, Overloaded
+from backend.metrics import server_timing_header, start_request_timing
+from backend.chatbot import agenerate_answer, astream_answer, close_async_client
+
+logger = logging.getLogger(__name__)
+
+CHAT_PATHS = ('/chat', '/chat/stream')
+
+chat_admission = AsyncAdmission(
+    flask_app.config['CHAT_ASYNC_MAX_CONCURRENT'],
+    flask_app.config['CHAT_ASYNC_MAX_QUEUE'],
+    queue_timeout=flask_app.config['CHAT_QUEUE_TIMEOUT'],
+    retry_after=flask_app.config['CHAT_RETRY_AFTER'],
+)
+
+
+class _ThreadPoolWsgiInstance(WsgiToAsgiInstance):
+    """
+    WsgiToAsgiInstance по умолчанию выполняет все WSGI-запросы в одном потоке
+    (thread_sensitive=True). Flask-страницам это не нужно — распределяем их по пулу.
+    """
+
+    @sync_to_async(thread_sensitive=False)
+    def run_wsgi_app(self, body):
+        return WsgiToAsgiInstance.__dict__['run_wsgi_app'].__wrapped__(self, body)
+
+
+class _ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _ThreadPoolWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(
+            scope, receive, send
+        )
+
+
+flask_asgi = _ThreadPoolWsgiToAsgi(flask_app)
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _stream_chat(send, message, top_k):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    try:
+        async for event, data in astream_answer(message, top_k=top_k):
+            await send({'type': 'http.response.body', 'body': sse_event(event, data).encode('utf-8'), 'more_body': True})
+        logger.info('Чат-бот обработал сообщение пользователя (async stream)')
+    except Exception as e:
+        logger.exception(f'Ошибка RAG-чатбота: {e}')
+        error = sse_event('error', {'error': 'Ошибка при обработке запроса чат-бота'})
+        await send({'type': 'http.response.body', 'body': error.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def chat_app(scope, receive, send):
+    """Асинхронные /chat и /chat/stream с тем же контрактом, что и во Flask-приложении."""
+    started = time.perf_counter()
+    status = 200
+
+    async def timed_send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            if flask_app.config['SERVER_TIMING']:
+                stages = server_timing_header()
+                if stages:
+                    message['headers'] = [*message['headers'], (b'server-timing', stages.encode())]
+        await send(message)
+
+    if flask_app.config['SERVER_TIMING']:
+        start_request_timing()
+    try:
+        await _chat_app(scope, receive, timed_send)
+    finally:
+        endpoint = 'chat_stream' if scope['path'] == '/chat/stream' else 'chat'
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method='POST', status=status)
+
+
+async def _chat_app(scope, receive, send):
+    try:
+        data = json.loads(await _read_body(receive) or b'null')
+    except ValueError:
+        data = None
+    message, top_k = parse_chat_payload(data)
+
+    if not message:
+        await _send_json(send, 400, {'error': 'Пустое сообщение'})
+        return
+
+    headers = dict(scope.get('headers') or [])
+    accept = headers.get(b'accept', b'').decode('latin1')
+    stream = scope['path'] == '/chat/stream' or accept.split(',')[0].strip() == 'text/event-stream'
+
+    try:
+        async with chat_admission.slot():
+            if stream:
+                await _stream_chat(send, message, top_k)
+                return
+            try:
+                result = await agenerate_answer(message, top_k=top_k)
+            except Exception as e:
+                logger.exception(f'Ошибка RAG-чатбота: {e}')
+                await _send_json(send, 500, {'error': 'Ошибка при обработке запроса чат-бота'})
+                return
+            logger.info('Чат-бот обработал сообщение пользователя (async)')
+            await _send_json(send, 200, result)
+    except Overloaded as e:
+        logger.warning('Запрос к чат-боту отклонён: превышен лимит одновременных запросов')
+        await _send_json(
+            send,
+            503,
+            {'error': 'Чат-бот сейчас перегружен, попробуйте через несколько секунд'},
+            headers=[(b'retry-after', str(e.retry_after).encode())],
+        )
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """Корневое ASGI-приложение: чат — асинхронно, остальное — через Flask."""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in CHAT_PATHS:
+        await chat_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -0,0 +1,124 @@
+"""
+Контроль допуска запросов к чат-боту.
+
+Ограничивает число одновременно обрабатываемых запросов и длину очереди
+ожидающих. Когда и то и другое заполнено, новый запрос сразу отклоняется
+(HTTP 503 с Retry-After), а не занимает воркер, нужный обычным страницам.
+"""
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+
+
+class Overloaded(Exception):
+    """Лимит одновременных запросов и очередь заполнены."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Сервис чат-бота перегружен")
+        self.retry_after = retry_after
+
+
+class _Counters:
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class Admission(_Counters):
+    """Контроль допуска для синхронных (WSGI) обработчиков."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float = 10.0, retry_after: int = 5):
+        super().__init__(max_concurrent, max_queue, queue_timeout, retry_after)
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            if self.active + self.waiting >= self.max_concurrent + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(self.retry_after)
+            self.waiting += 1
+
+        acquired = self._semaphore.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.rejected += 1
+                raise Overloaded(self.retry_after)
+            self.active += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._semaphore.release()
+
+    @contextmanager
+    def slots(self, wanted: int):
+        """
+        Слот для запроса, выполняющего до wanted обращений к LLM параллельно: один слот
+        занимается как в slot(), остальные — только свободные и без ожидания, если очереди нет.
+        Возвращает число занятых слотов — столько обращений запрос может выполнять одновременно.
+        """
+        with self.slot():
+            extra = 0
+            with self._lock:
+                while extra < wanted - 1 and not self.waiting and self._semaphore.acquire(blocking=False):
+                    extra += 1
+                self.active += extra
+            try:
+                yield 1 + extra
+            finally:
+                with self._lock:
+                    self.active -= extra
+                for _ in range(extra):
+                    self._semaphore.release()
+
+
+class AsyncAdmission(_Counters):
+    """Контроль допуска для асинхронных (ASGI) обработчиков; используется в одном event loop."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float = 10.0, retry_after: int = 5):
+        super().__init__(max_concurrent, max_queue, queue_timeout, retry_after)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.active + self.waiting >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
@@ -0,0 +1,211 @@
+"""
+Сборка статических файлов: минификация, имена с хешем содержимого и сжатые копии.
+
+    python -m backend.assets build
+
+Для каждого CSS/JS-файла из static/ создаётся static/dist/<путь>.<хеш>.<ext>
+плюс .gz и .br рядом с ним, а в static/dist/manifest.json записывается
+соответствие исходного имени собранному. Имя меняется вместе с содержимым,
+поэтому собранные файлы можно кешировать в браузере навсегда.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него создаются только .gz
+    brotli = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STATIC_DIR = BASE_DIR / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_PATH = DIST_DIR / "manifest.json"
+
+_CSS_STRING_OR_COMMENT = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|/\*.*?\*/", re.S)
+# После этих символов и ключевых слов JS-регулярное выражение может начаться, а деление — нет
+_JS_REGEX_PREFIX = set("(,=:[!&|?{};+-*%<>~^") | {"", "\n"}
+_JS_REGEX_KEYWORDS = frozenset("return typeof case in of delete void throw new instanceof yield".split())
+_JS_WORD_TAIL = re.compile(r"(\.?)([A-Za-z0-9_$]+)$")
+# Пробел рядом с этими символами ничего не значит
+_JS_PUNCTUATION = set("{}()[];,:=<>!&|?")
+
+
+def minify_css(source: str) -> str:
+    """Убирает комментарии и лишние пробелы, не трогая строки в кавычках."""
+    strings: List[str] = []
+
+    def stash(match: re.Match) -> str:
+        if not match.group(1):
+            return " "
+        strings.append(match.group(1))
+        return f"\x00{len(strings) - 1}\x00"
+
+    code = _squeeze_css(_CSS_STRING_OR_COMMENT.sub(stash, source))
+    return re.sub(r"\x00(\d+)\x00", lambda match: strings[int(match.group(1))], code).strip()
+
+
+def _squeeze_css(code: str) -> str:
+    code = re.sub(r"\s+", " ", code)
+    code = re.sub(r"\s*([{};,>])\s*", r"\1", code)
+    code = re.sub(r":\s+", ":", code)
+    return code.replace(";}", "}")
+
+
+def minify_js(source: str) -> str:
+    """
+    Консервативная минификация JS: удаляет комментарии и отступы, схлопывает пробелы.
+    Строки, шаблонные строки и регулярные выражения копируются как есть;
+    переводы строк сохраняются, чтобы не сломать автоматическую расстановку точек с запятой.
+    """
+    out: List[str] = []
+    i, n = 0, len(source)
+    pending = ""  # отложенный пробел или перевод строки
+
+    def last_char() -> str:
+        for chunk in reversed(out):
+            if chunk:
+                return chunk[-1]
+        return ""
+
+    def regex_allowed() -> bool:
+        """По предыдущему токену: / начинает регулярное выражение, а не деление."""
+        if last_char() in _JS_REGEX_PREFIX:
+            return True
+        # Слово целиком лежит в последнем фрагменте: фрагменты делятся только пробелами, кавычками и /
+        match = _JS_WORD_TAIL.search(next((chunk for chunk in reversed(out) if chunk), ""))
+        # obj.return — свойство, а не ключевое слово
+        return bool(match) and not match.group(1) and match.group(2) in _JS_REGEX_KEYWORDS
+
+    def emit(chunk: str) -> None:
+        nonlocal pending
+        if pending:
+            prev = last_char()
+            if pending == "\n" and prev not in ("", "\n"):
+                out.append("\n")
+            elif pending == " " and prev not in _JS_PUNCTUATION and chunk[0] not in _JS_PUNCTUATION and prev not in ("", "\n"):
+                out.append(" ")
+            pending = ""
+        out.append(chunk)
+
+    while i < n:
+        ch = source[i]
+        if ch in " \t\r\n":
+            j = i
+            while j < n and source[j] in " \t\r\n":
+                j += 1
+            if "\n" in source[i:j] or pending == "\n":
+                pending = "\n"
+            elif not pending:
+                pending = " "
+            i = j
+        elif source.startswith("//", i):
+            j = source.find("\n", i)
+            i = n if j < 0 else j
+        elif source.startswith("/*", i):
+            j = source.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            pending = pending or " "
+        elif ch in "'\"`":
+            j = i + 1
+            while j < n and source[j] != ch:
+                j += 2 if source[j] == "\\" else 1
+            emit(source[i:j + 1])
+            i = j + 1
+        elif ch == "/" and regex_allowed():
+            j, in_class = i + 1, False
+            while j < n and (source[j] != "/" or in_class):
+                if source[j] == "\\":
+                    j += 1
+                elif source[j] == "[":
+                    in_class = True
+                elif source[j] == "]":
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and source[j].isalpha():  # флаги
+                j += 1
+            emit(source[i:j])
+            i = j
+        else:
+            j = i + 1
+            while j < n and source[j] not in " \t\r\n'\"`/":
+                j += 1
+            emit(source[i:j])
+            i = j
+    return "".join(out).strip() + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def _write(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def build_assets(static_dir: Path = STATIC_DIR, dist_dir: Path = DIST_DIR) -> Dict[str, str]:
+    """
+    Собирает CSS/JS из static_dir в dist_dir и пишет манифест.
+    Файлы прошлых сборок не удаляются: их ещё могут запрашивать открытые страницы.
+    """
+    manifest: Dict[str, str] = {}
+    for source in sorted(static_dir.rglob("*")):
+        if dist_dir in source.parents or source.suffix not in MINIFIERS or not source.is_file():
+            continue
+        name = source.relative_to(static_dir).as_posix()
+        body = MINIFIERS[source.suffix](source.read_text(encoding="utf-8")).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        target = dist_dir / Path(name).with_name(f"{source.stem}.{digest}{source.suffix}")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        _write(target, body)
+        _write(target.with_name(target.name + ".gz"), gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(target.with_name(target.name + ".br"), brotli.compress(body, quality=11))
+        manifest[name] = target.relative_to(static_dir).as_posix()
+
+    dist_dir.mkdir(parents=True, exist_ok=True)
+    _write(dist_dir / MANIFEST_PATH.name, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return manifest
+
+
+class AssetManifest:
+    """Манифест собранных файлов; перечитывается, если сборку запустили заново."""
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        self._mtime: Optional[int] = None
+        self._entries: Dict[str, str] = {}
+
+    def get(self, filename: str) -> Optional[str]:
+        """Путь собранного файла относительно static/ или None, если сборки нет."""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._mtime:
+            self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+            self._mtime = mtime
+        return self._entries.get(filename)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m backend.assets")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="собрать static/dist и manifest.json")
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        for name, target in build_assets().items():
+            size = (STATIC_DIR / target).stat().st_size
+            print(f"{name} -> {target} ({(STATIC_DIR / name).stat().st_size} -> {size} байт)")
+
+
+if __name__ == "__main__":
+    main()
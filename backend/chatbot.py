@@ -0,0 +1,192 @@
+"""
+Лёгкий фасад чат-бота.
+
+backend.rag_index тянет за собой faiss, numpy и openai. Фасад импортирует его
+при первом обращении к чату, поэтому воркеры, которые отдают только страницы,
+стартуют быстро. При включённом прогреве (prewarm) импорт, загрузка индекса
+и создание HTTP-клиентов OpenAI выполняются в фоновом потоке сразу при запуске,
+и первый запрос к чату их не ждёт.
+
+Время импорта, прогрева и первого ответа чата доступно в status() и в /metrics.
+"""
+
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from backend.metrics import CallbackMetric
+
+logger = logging.getLogger(__name__)
+
+_module = None
+_lock = threading.Lock()
+_reload_interval = 0.0
+_prewarm_thread: threading.Thread | None = None
+# Прогрев включён (RAG_PREWARM или загрузка в мастере): до его окончания чат-бот не готов
+_prewarm_requested = False
+# В мастер-процессе перед fork фоновые потоки не запускаются: в воркеры они не переходят
+_defer_threads = False
+
+# Длительности запуска (секунды) и состояние прогрева
+_timings: Dict[str, float] = {}
+_warm = threading.Event()
+_error: str | None = None
+
+
+def rag():
+    """Модуль backend.rag_index; при первом вызове импортирует его."""
+    global _module
+    if _module is None:
+        with _lock:
+            if _module is None:
+                started = time.perf_counter()
+                module = importlib.import_module("backend.rag_index")
+                _timings["import"] = time.perf_counter() - started
+                logger.info(f"Модуль чат-бота загружен за {_timings['import']:.2f} с")
+                if _reload_interval > 0 and not _defer_threads:
+                    module.start_reloader(_reload_interval)
+                _module = module
+    return _module
+
+
+async def _arag():
+    """rag() для event loop: импорт выполняется в потоке, чтобы не блокировать loop."""
+    if _module is not None:
+        return _module
+    return await asyncio.to_thread(rag)
+
+
+def start_reloader(interval: float) -> None:
+    """Фоновая перезагрузка индекса; до импорта модуля только запоминает интервал."""
+    global _reload_interval
+    _reload_interval = interval
+    if _module is not None and interval > 0 and not _defer_threads:
+        _module.start_reloader(interval)
+
+
+def prewarm() -> None:
+    """Импорт модуля, загрузка (или построение) индекса и создание клиентов OpenAI."""
+    global _error
+    started = time.perf_counter()
+    try:
+        module = rag()
+        module.get_snapshot()
+        module.get_client()
+        module.get_async_client()
+    except Exception as e:
+        _error = str(e)
+        logger.exception(f"Ошибка прогрева чат-бота: {e}")
+        return
+    _timings["warmup"] = time.perf_counter() - started
+    _error = None
+    _warm.set()
+    logger.info(f"Чат-бот прогрет за {_timings['warmup']:.2f} с")
+
+
+def preload() -> None:
+    """
+    Прогрев в мастер-процессе до fork воркеров (см. wsgi.py): индекс загружается один раз,
+    а воркеры делят его страницы памяти. Фоновые потоки откладываются до after_fork().
+    """
+    global _defer_threads, _prewarm_requested
+    _defer_threads = True
+    _prewarm_requested = True
+    prewarm()
+
+
+def after_fork() -> None:
+    """В воркере после fork: сбросить соединения модуля и запустить его фоновые потоки."""
+    global _defer_threads
+    _defer_threads = False
+    if _module is not None:
+        _module.reset_after_fork()
+        if _reload_interval > 0:
+            _module.start_reloader(_reload_interval)
+
+
+def start_prewarm() -> None:
+    """Запускает prewarm в фоновом потоке (однократно на процесс)."""
+    global _prewarm_thread, _prewarm_requested
+    _prewarm_requested = True
+    if _prewarm_thread is not None and _prewarm_thread.is_alive():
+        return
+    _prewarm_thread = threading.Thread(target=prewarm, name="rag-prewarm", daemon=True)
+    _prewarm_thread.start()
+
+
+def status() -> Dict:
+    """
+    Готовность чат-бота и длительности запуска. Без прогрева чат-бот готов сразу
+    (индекс загрузится при первом запросе), с прогревом — когда индекс загружен.
+    """
+    warm = _warm.is_set() or (_module is not None and _module.snapshot_loaded())
+    return {
+        "ready": warm or not _prewarm_requested,
+        "warm": warm,
+        "imported": _module is not None,
+        "prewarming": _prewarm_thread is not None and _prewarm_thread.is_alive(),
+        "error": _error,
+        **{f"{name}_seconds": round(seconds, 4) for name, seconds in _timings.items()},
+    }
+
+
+def _record_first_chat(started: float) -> None:
+    if "first_chat" not in _timings:
+        _timings["first_chat"] = time.perf_counter() - started
+    _warm.set()
+
+
+def generate_answer(message: str, top_k: int = 3) -> Dict:
+    started = time.perf_counter()
+    result = rag().generate_answer(message, top_k=top_k)
+    _record_first_chat(started)
+    return result
+
+
+def generate_answers(messages: List[str], top_k: int = 3, concurrency: int | None = None) -> List[Dict]:
+    started = time.perf_counter()
+    results = rag().generate_answers(messages, top_k=top_k, concurrency=concurrency)
+    # Пакет, в котором все вопросы завершились ошибкой, не говорит о готовности
+    if any("error" not in result for result in results):
+        _record_first_chat(started)
+    return results
+
+
+def stream_answer(message: str, top_k: int = 3) -> Iterator[Tuple[str, object]]:
+    started = time.perf_counter()
+    yield from rag().stream_answer(message, top_k=top_k)
+    _record_first_chat(started)
+
+
+def reload_index(force_rebuild: bool = False) -> Dict:
+    return rag().reload_index(force_rebuild=force_rebuild)
+
+
+async def agenerate_answer(message: str, top_k: int = 3) -> Dict:
+    started = time.perf_counter()
+    result = await (await _arag()).agenerate_answer(message, top_k=top_k)
+    _record_first_chat(started)
+    return result
+
+
+async def astream_answer(message: str, top_k: int = 3):
+    started = time.perf_counter()
+    async for item in (await _arag()).astream_answer(message, top_k=top_k):
+        yield item
+    _record_first_chat(started)
+
+
+async def close_async_client() -> None:
+    if _module is not None:
+        await _module.close_async_client()
+
+
+CallbackMetric(
+    "rag_startup_seconds",
+    "Запуск чат-бота: импорт модуля, прогрев, первый ответ",
+    lambda: {(phase,): seconds for phase, seconds in _timings.items()},
+    ["phase"],
+)
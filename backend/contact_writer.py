@@ -0,0 +1,235 @@
+"""
+Отложенная пакетная запись заявок (write-behind).
+
+Обработчик формы не ждёт блокировку записи SQLite: проверенная заявка кладётся
+в ограниченную очередь в памяти, а фоновый поток записывает накопившиеся заявки
+одним многострочным INSERT в одной транзакции.
+
+Чтобы заявки из очереди не терялись при падении процесса, каждая сначала
+дописывается в файл-журнал (spool) процесса. После записи в БД в журнал
+добавляется отметка о сохранении, а когда очередь пуста — журнал обнуляется.
+При старте журналы завершившихся процессов дочитываются и сохраняются.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: журналы не блокируются, считаем процесс единственным
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Очередь заявок заполнена: запись в БД не успевает за потоком заявок."""
+
+
+class ContactWriter:
+    """
+    Очередь заявок с фоновой пакетной записью.
+
+    insert_batch(records) должна записать список словарей одной транзакцией
+    и бросить исключение при ошибке — тогда пакет будет записан повторно.
+    """
+
+    def __init__(
+        self,
+        insert_batch: Callable[[List[Dict]], None],
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        spool_dir: Optional[Path] = None,
+        fsync: bool = True,
+    ):
+        self.insert_batch = insert_batch
+        self.batch_size = batch_size
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.fsync = fsync
+        self.max_queue = max_queue
+        self._reset()
+        atexit.register(self.close)
+        # Воркеры gunicorn/uwsgi получают копию объекта через fork — без потока и с чужими блокировками
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._queue: "queue.Queue[Tuple[str, Dict]]" = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        # Журнал родителя остаётся за ним: после fork процесс открывает свой
+        self._spool = None
+        self.pending = 0
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+
+    # --- Журнал ---
+
+    def _open_spool(self) -> None:
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        # Уникальное имя: PID может повториться, например после перезапуска контейнера
+        path = self.spool_dir / f"contacts-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        self._spool = open(path, "a", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(self._spool.fileno(), fcntl.LOCK_EX)
+
+    def _append(self, entry: Dict) -> None:
+        self._spool.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    def _replay_spools(self) -> None:
+        """Сохраняет заявки из журналов завершившихся процессов (их файлы никто не держит)."""
+        for path in sorted(self.spool_dir.glob("contacts-*.jsonl")):
+            if path.name == Path(self._spool.name).name:
+                continue
+            with open(path, "a+", encoding="utf-8") as spool:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # журнал живого процесса
+                spool.seek(0)
+                records: Dict[str, Dict] = {}
+                for line in spool:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # строка, недописанная при падении
+                    if "done" in entry:
+                        for record_id in entry["done"]:
+                            records.pop(record_id, None)
+                    else:
+                        records[entry["id"]] = entry["record"]
+                pending = list(records.values())
+                for start in range(0, len(pending), self.batch_size):
+                    if not self._insert_with_retry(pending[start:start + self.batch_size]):
+                        return
+                path.unlink()
+                if pending:
+                    logger.info("Восстановлено %s заявок из журнала %s", len(pending), path.name)
+
+    # --- Запись ---
+
+    def start(self) -> None:
+        """Запускает фоновый поток (однократно на процесс, в том числе после fork)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="contact-writer", daemon=True)
+            self._thread.start()
+        ready.wait()
+
+    def submit(self, record: Dict) -> None:
+        """Ставит заявку в очередь; QueueFull, если очередь заполнена."""
+        self.start()
+        record_id = uuid.uuid4().hex
+        with self._lock:
+            if self._queue.full():
+                self.rejected += 1
+                raise QueueFull()
+            if self._spool is not None:
+                self._append({"id": record_id, "record": record})
+            self._queue.put_nowait((record_id, record))
+            self.pending += 1
+
+    def _run(self, ready: threading.Event) -> None:
+        if self.spool_dir is not None:
+            self._open_spool()
+        ready.set()
+        if self.spool_dir is not None:
+            self._replay_spools()
+
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            # Пока писался прошлый пакет, очередь накопила следующий — забираем его целиком
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._insert_with_retry([record for _, record in batch]):
+                return
+            with self._lock:
+                self.pending -= len(batch)
+                self.written += len(batch)
+                self.batches += 1
+                if self._spool is not None:
+                    if self.pending == 0:
+                        self._spool.truncate(0)
+                    else:
+                        self._append({"done": [record_id for record_id, _ in batch]})
+                self._idle.notify_all()
+
+    def _insert_with_retry(self, records: List[Dict]) -> bool:
+        """
+        Пишет пакет, повторяя с растущей паузой. False — процесс останавливается,
+        а заявки остались в журнале и будут записаны при следующем запуске.
+        """
+        delay = 0.5
+        while True:
+            try:
+                self.insert_batch(records)
+                return True
+            except Exception as e:
+                self.errors += 1
+                logger.error("Ошибка записи %s заявок, повтор через %.1f с: %s", len(records), delay, e)
+                if self._stop.wait(delay) and self._spool is not None:
+                    return False
+                delay = min(delay * 2, 30.0)
+
+    # --- Управление ---
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт, пока все поставленные заявки будут записаны. False — по таймауту."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self.pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Дописывает очередь и останавливает поток."""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        self._stop.set()
+        thread.join(timeout)
+        with self._lock:
+            if self._spool is not None and not thread.is_alive() and self.pending == 0:
+                # Всё записано — пустой журнал больше не нужен
+                os.unlink(self._spool.name)
+                self._spool.close()
+                self._spool = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "written": self.written,
+                "batches": self.batches,
+                "rejected": self.rejected,
+                "errors": self.errors,
+            }
@@ -0,0 +1,108 @@
+"""
+Сборка контекста FAQ для промпта в пределах бюджета токенов.
+
+Из найденных FAQ остаются только достаточно похожие на запрос (абсолютный порог
+по косинусной близости и порог относительно лучшего результата), почти
+одинаковые FAQ схлопываются в один, длинные ответы обрезаются, а суммарный
+объём контекста ограничен бюджетом токенов.
+
+Токены считаются приближённо, без токенизатора модели и сетевых запросов:
+слово — один токен на каждые ~4 символа, знак препинания — один токен.
+Для русского и английского текста оценка получается чуть завышенной, то есть
+бюджет не превышается.
+"""
+
+import math
+import re
+from typing import Callable, Dict, List, Optional
+
+from backend.lexical_index import tokenize
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Приближённое число токенов текста."""
+    return sum(math.ceil(len(word) / CHARS_PER_TOKEN) for word in _WORD_RE.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Обрезает текст по границе слова так, чтобы он укладывался в max_tokens (с многоточием)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    used = 1  # многоточие
+    end = 0
+    for match in _WORD_RE.finditer(text):
+        used += math.ceil(len(match.group()) / CHARS_PER_TOKEN)
+        if used > max_tokens:
+            break
+        end = match.end()
+    return text[:end].rstrip() + "…"
+
+
+def _similarity(a: set, b: set) -> float:
+    """Коэффициент Жаккара по основам слов."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def format_item(item: Dict) -> str:
+    return f"Вопрос: {item['question']}\nОтвет: {item['answer']}"
+
+
+def pack_context(
+    related: List[Dict],
+    token_budget: int,
+    min_score: float = 0.0,
+    relative_floor: float = 0.0,
+    duplicate_threshold: float = 1.0,
+    max_answer_tokens: Optional[int] = None,
+    dense_score: Callable[[Dict], Optional[float]] = lambda item: None,
+) -> List[Dict]:
+    """
+    Отбирает FAQ для промпта (related отсортированы по убыванию score).
+
+    - min_score — порог косинусной близости; применяется, только если dense_score её знает
+      (BM25- и RRF-оценки не нормированы);
+    - relative_floor — доля score лучшего результата, ниже которой FAQ отбрасываются:
+      число FAQ в контексте подстраивается под распределение оценок;
+    - duplicate_threshold — близость текстов, начиная с которой FAQ считается дублем;
+    - max_answer_tokens — предел длины одного ответа;
+    - token_budget — предел суммарного объёма блоков контекста.
+    """
+    if not related:
+        return []
+    best = related[0]["score"]
+    packed: List[Dict] = []
+    seen: List[set] = []
+    used = 0
+    for item in related:
+        score = dense_score(item)
+        if score is not None and score < min_score:
+            continue
+        if best > 0 and item["score"] < best * relative_floor:
+            continue
+
+        terms = set(tokenize(f"{item['question']} {item['answer']}"))
+        if any(_similarity(terms, other) >= duplicate_threshold for other in seen):
+            continue
+
+        answer = item["answer"]
+        if max_answer_tokens is not None:
+            answer = truncate_to_tokens(answer, max_answer_tokens)
+        candidate = {**item, "answer": answer}
+        cost = estimate_tokens(format_item(candidate))
+        if used + cost > token_budget:
+            if packed:
+                break
+            # Даже первый FAQ не помещается — берём его обрезанным, а не пустой контекст
+            overhead = cost - estimate_tokens(answer)
+            candidate["answer"] = truncate_to_tokens(answer, max(token_budget - overhead, 1))
+            cost = estimate_tokens(format_item(candidate))
+
+        packed.append(candidate)
+        seen.append(terms)
+        used += cost
+    return packed
@@ -0,0 +1,133 @@
+"""
+Кеш эмбеддингов текстов.
+
+Двухуровневый кеш: LRU в памяти процесса и необязательное хранилище SQLite
+на диске, общее для всех воркеров и переживающее перезапуск приложения.
+Ключ — модель эмбеддингов плюс хеш нормализованного текста.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Нормализует текст для ключа кеша: схлопывает пробелы и переводы строк."""
+    return " ".join(text.split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """Ключ кеша: sha256 от имени модели и нормализованного текста."""
+    payload = f"{model}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """LRU-кеш эмбеддингов с опциональным дисковым уровнем в SQLite."""
+
+    def __init__(self, max_size: int = 2048, db_path: Optional[Path] = None):
+        self.max_size = max_size
+        self.db_path = db_path
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Соединение с SQLite, своё для каждого потока."""
+        if self.db_path is None:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Возвращает эмбеддинги для текстов; None — для отсутствующих в кеше."""
+        keys = [cache_key(model, t) for t in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+
+        missing: Dict[str, List[int]] = {}
+        with self._lock:
+            for pos, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[pos] = vector
+                else:
+                    missing.setdefault(key, []).append(pos)
+
+        conn = self._connection()
+        if missing and conn is not None:
+            placeholders = ",".join("?" * len(missing))
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                list(missing),
+            ).fetchall()
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype="float32")
+                self._remember(key, vector)
+                for pos in missing.pop(key):
+                    results[pos] = vector
+                    self.disk_hits += 1
+
+        self.misses += sum(len(p) for p in missing.values())
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: np.ndarray) -> None:
+        """Сохраняет эмбеддинги в память и, если включено, на диск."""
+        rows = []
+        for text, vector in zip(texts, vectors):
+            key = cache_key(model, text)
+            vector = np.ascontiguousarray(vector, dtype="float32")
+            self._remember(key, vector)
+            rows.append((key, int(vector.shape[0]), vector.tobytes()))
+
+        conn = self._connection()
+        if rows and conn is not None:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                    rows,
+                )
+
+    def clear(self) -> None:
+        """Очищает оба уровня кеша."""
+        with self._lock:
+            self._memory.clear()
+        conn = self._connection()
+        if conn is not None:
+            with conn:
+                conn.execute("DELETE FROM embeddings")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,96 @@
+"""
+Компактное хранилище метаданных FAQ для RAG-индекса.
+
+Формат на диске (три файла с общим префиксом):
+- <prefix>.ids.npy     — int64, отсортированные ID записей
+- <prefix>.offsets.npy — int64, n+1 смещений записей в blob
+- <prefix>.blob        — UTF-8 JSON записей, уложенные подряд
+
+Массивы и blob открываются через mmap, поэтому загрузка не зависит от числа FAQ,
+а страницы файла разделяются между воркерами. Запись декодируется только
+при обращении к ней, т.е. для top-k результатов поиска.
+"""
+
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+def _paths(prefix: Path):
+    return (
+        prefix.with_name(prefix.name + ".ids.npy"),
+        prefix.with_name(prefix.name + ".offsets.npy"),
+        prefix.with_name(prefix.name + ".blob"),
+    )
+
+
+def store_exists(prefix: Path) -> bool:
+    return all(p.exists() for p in _paths(prefix))
+
+
+def write_store(prefix: Path, faqs: Iterable[Dict]) -> None:
+    """
+    Записывает FAQ (словари с ключом "id") в компактный формат.
+    Файлы пишутся во временные и атомарно подменяются.
+    """
+    records = sorted(faqs, key=lambda f: f["id"])
+    ids = np.array([f["id"] for f in records], dtype="int64")
+    offsets = np.zeros(len(records) + 1, dtype="int64")
+    chunks: List[bytes] = []
+    for i, faq in enumerate(records):
+        payload = {k: v for k, v in faq.items() if k != "id"}
+        chunk = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        chunks.append(chunk)
+        offsets[i + 1] = offsets[i] + len(chunk)
+
+    ids_path, offsets_path, blob_path = _paths(prefix)
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    for path, write in (
+        (ids_path, lambda f: np.save(f, ids)),
+        (offsets_path, lambda f: np.save(f, offsets)),
+        (blob_path, lambda f: f.write(b"".join(chunks))),
+    ):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+
+class FaqStore:
+    """Доступ к FAQ по ID без загрузки всех записей в память."""
+
+    def __init__(self, prefix: Path):
+        ids_path, offsets_path, blob_path = _paths(prefix)
+        self.ids = np.load(ids_path, mmap_mode="r")
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self._blob_file = blob_path.open("rb")
+        size = os.fstat(self._blob_file.fileno()).st_size
+        # mmap нулевой длины недопустим — пустой blob читаем как b""
+        self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _record(self, position: int) -> Dict:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return json.loads(self._blob[start:end].decode("utf-8"))
+
+    def get(self, faq_id: int) -> Optional[Dict]:
+        """Возвращает FAQ по ID или None."""
+        position = int(np.searchsorted(self.ids, faq_id))
+        if position >= len(self.ids) or int(self.ids[position]) != faq_id:
+            return None
+        return self._record(position)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for position, faq_id in enumerate(self.ids):
+            yield {**self._record(position), "id": int(faq_id)}
+
+    def close(self) -> None:
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._blob_file.close()
@@ -0,0 +1,148 @@
+"""
+Локальный лексический индекс FAQ (BM25) с упрощённым стеммингом для русского языка.
+
+Работает без сети: используется для гибридного поиска вместе с FAISS
+и как самостоятельный режим, когда эмбеддинги недоступны или не нужны.
+Веса BM25 для каждой пары (термин, документ) считаются при построении,
+поэтому запрос сводится к сложению нескольких срезов массива.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-zа-я0-9]+")
+
+STOPWORDS = frozenset(
+    """
+    и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только
+    ее мне было вот от меня еще нет о из ему теперь когда ли если уже или ни быть был него до
+    вас опять уж вам ведь там потом себя ей может они тут где есть надо ней для мы тебя их чем
+    была сам чтоб без чего раз тоже себе под будет ж тогда кто этот того потому этого какой
+    ним здесь этом почти мой тем чтобы нее сейчас были куда зачем всех можно при об хоть после
+    над тот через эти нас про всего них какая много эту моя свою этой перед том им всю ваш
+    ваша ваше ваши вашей вами
+    """.split()
+)
+
+# Окончания сортируются по убыванию длины: отрезается самое длинное подходящее
+_ENDINGS = sorted(
+    """
+    иями ями ами иях ях ах ием ией ий ой ей ый ого его ому ему ыми ими ая яя ое ее ые ие ую юю
+    ом ем ов ев ам ям ия ья ью ть ться тся ешь ете ишь ите ает яет ают яют ют ут ат ят ет ит ла
+    ли ло ость ости ение ения ании ание а я о е ы и у ю ь
+    """.split(),
+    key=len,
+    reverse=True,
+)
+_MIN_STEM = 3
+
+
+def stem(word: str) -> str:
+    """Отрезает типичное окончание, оставляя основу не короче трёх букв."""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Нижний регистр, ё→е, разбиение по не-буквам, стоп-слова и стемминг."""
+    words = _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return [stem(w) for w in words if w not in STOPWORDS]
+
+
+class BM25Index:
+    """Инвертированный индекс с предрассчитанными весами BM25."""
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        terms: np.ndarray,
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        weights: np.ndarray,
+    ):
+        self.ids = ids
+        self.postings = postings
+        self.weights = weights
+        self._terms: Dict[str, Tuple[int, int]] = {
+            str(term): (int(offsets[i]), int(offsets[i + 1])) for i, term in enumerate(terms)
+        }
+        self._arrays = (terms, offsets)
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[int, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Строит индекс по парам (ID, текст)."""
+        ids: List[int] = []
+        term_freqs: List[Dict[str, int]] = []
+        for doc_id, text in docs:
+            freqs: Dict[str, int] = {}
+            for token in tokenize(text):
+                freqs[token] = freqs.get(token, 0) + 1
+            ids.append(doc_id)
+            term_freqs.append(freqs)
+
+        n_docs = len(ids)
+        lengths = np.array([sum(f.values()) for f in term_freqs], dtype="float32")
+        avg_length = float(lengths.mean()) if n_docs and lengths.mean() > 0 else 1.0
+
+        postings_by_term: Dict[str, List[Tuple[int, int]]] = {}
+        for doc, freqs in enumerate(term_freqs):
+            for term, tf in freqs.items():
+                postings_by_term.setdefault(term, []).append((doc, tf))
+
+        terms = sorted(postings_by_term)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        postings: List[int] = []
+        weights: List[float] = []
+        for i, term in enumerate(terms):
+            entries = postings_by_term[term]
+            idf = np.log(1.0 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            for doc, tf in entries:
+                norm = tf + k1 * (1.0 - b + b * lengths[doc] / avg_length)
+                postings.append(doc)
+                weights.append(idf * tf * (k1 + 1.0) / norm)
+            offsets[i + 1] = len(postings)
+
+        return cls(
+            np.array(ids, dtype="int64"),
+            np.array(terms, dtype=str),
+            offsets,
+            np.array(postings, dtype="int32"),
+            np.array(weights, dtype="float32"),
+        )
+
+    def save(self, path: Path) -> None:
+        terms, offsets = self._arrays
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            np.savez(f, ids=self.ids, terms=terms, offsets=offsets, postings=self.postings, weights=self.weights)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path) as data:
+            return cls(data["ids"], data["terms"], data["offsets"], data["postings"], data["weights"])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Возвращает до top_k пар (ID, BM25-score) по убыванию score."""
+        spans = [self._terms[t] for t in set(tokenize(query)) if t in self._terms]
+        if not spans or top_k <= 0:
+            return []
+
+        scores = np.zeros(len(self.ids), dtype="float32")
+        for start, end in spans:
+            scores[self.postings[start:end]] += self.weights[start:end]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(self.ids[doc]), float(scores[doc])) for doc in matched]
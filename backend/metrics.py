@@ -0,0 +1,204 @@
+"""
+Метрики приложения в формате Prometheus.
+
+Гистограммы и счётчики хранятся в памяти процесса и отдаются эндпоинтом
+/metrics; при нескольких воркерах каждый отдаёт свои значения. Кроме того,
+длительности этапов текущего запроса собираются для заголовка Server-Timing.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Этапы текущего запроса: список (этап, секунды) или None, если сбор не включён
+_request_timings: ContextVar[List[Tuple[str, float]] | None] = ContextVar("request_timings", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), registry: "Registry | None" = None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Гистограмма длительностей с фиксированными границами корзин."""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # [счётчики корзин..., сумма, количество]
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = self.header()
+        for key, values in sorted(series.items()):
+            bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+            counts = values[:-2] + [values[-1]]
+            for bound, count in zip(bounds, counts):
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_number(count)}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(values[-2])}")
+            lines.append(f"{self.name}_count{labels} {_number(values[-1])}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Метрика, значения которой читаются при каждом запросе /metrics,
+    например из счётчиков кешей. fn возвращает {значения меток: число}.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        fn: Callable[[], Dict[Tuple[str, ...], float]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+        registry: "Registry | None" = None,
+    ):
+        self.kind = kind
+        self.fn = fn
+        super().__init__(name, help_text, labelnames, registry)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(self.fn().items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_metrics() -> str:
+    """Все метрики процесса в текстовом формате Prometheus."""
+    return REGISTRY.render()
+
+
+@contextmanager
+def timed(histogram: Histogram, name: str, **labels):
+    """Замеряет блок в гистограмму и, если сбор включён, в Server-Timing текущего запроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def start_request_timing() -> None:
+    """Начинает сбор этапов для Server-Timing в текущем контексте (потоке или задаче)."""
+    _request_timings.set([])
+
+
+def server_timing_header() -> str | None:
+    """Значение заголовка Server-Timing по собранным этапам; повторяющиеся этапы суммируются."""
+    timings = _request_timings.get()
+    if not timings:
+        return None
+    totals: Dict[str, float] = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
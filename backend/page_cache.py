@@ -0,0 +1,111 @@
+"""
+Кеш отрендеренных страниц.
+
+Хранит готовое тело страницы вместе с заранее сжатыми gzip/brotli-вариантами
+и их ETag, так что повторный просмотр не рендерит шаблоны и не сжимает ответ.
+Кеш сбрасывается, когда меняются данные страниц или файлы шаблонов.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Iterable, NamedTuple, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаём только gzip
+    brotli = None
+
+
+class CachedPage(NamedTuple):
+    mimetype: str
+    # Кодировка ("identity", "gzip", "br") -> (тело, ETag без кавычек)
+    variants: Dict[str, tuple]
+
+    def etags(self):
+        return [etag for _, etag in self.variants.values()]
+
+
+def _compress(body: bytes) -> Dict[str, bytes]:
+    encoded = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded["br"] = brotli.compress(body, quality=11)
+    return encoded
+
+
+class PageCache:
+    """LRU-кеш страниц с версией по данным и времени изменения шаблонов."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        watch_paths: Iterable[Path],
+        data: Callable[[], object],
+        check_interval: float = 1.0,
+    ):
+        self.max_entries = max_entries
+        self.watch_paths = list(watch_paths)
+        self.data = data
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _current_version(self) -> str:
+        digest = hashlib.sha256(json.dumps(self.data(), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        for root in self.watch_paths:
+            for path in sorted(root.rglob("*")) if root.is_dir() else [root]:
+                if path.is_file():
+                    digest.update(f"{path}:{path.stat().st_mtime_ns}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _validate(self) -> None:
+        """Не чаще раза в check_interval сверяет версию и при изменении очищает кеш."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self._current_version()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        with self._lock:
+            self._validate()
+            page = self._entries.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key: Hashable, body: bytes, mimetype: str) -> CachedPage:
+        tag = hashlib.sha256(body).hexdigest()[:32]
+        variants = {
+            encoding: (payload, tag if encoding == "identity" else f"{tag}-{encoding}")
+            for encoding, payload in _compress(body).items()
+        }
+        page = CachedPage(mimetype, variants)
+        with self._lock:
+            self._entries[key] = page
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return page
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -4,27 +4,277 @@ RAG-чатбот для FAQ, адаптация из репо pcef9 под Flask
 Функции:
 - ensure_index()  — лениво строит/загружает FAISS-индекс
 - generate_answer(message, top_k=3) — возвращает ответ и использованный контекст
+- stream_answer(message, top_k=3) — то же самое, но отдаёт контекст и токены ответа по мере генерации
+- generate_answers(messages, top_k=3) — ответы на пакет вопросов: один запрос эмбеддингов, один поиск FAISS
+- agenerate_answer() / astream_answer() — асинхронные версии на AsyncOpenAI для ASGI-приложения
+- answer_cache_stats() — счётчики попаданий/промахов кеша ответов
+- embedding_cache_stats() — счётчики кеша эмбеддингов (память/диск)
+- coalescing_stats() — сколько одинаковых одновременных запросов объединено
+- answer_mode_stats() — доля ответов, отданных напрямую из FAQ без вызова LLM
+- reload_index() / start_reloader() — горячая перезагрузка индекса без перезапуска приложения
+- get_embedding_provider() — источник эмбеддингов: OpenAI или локальный (RAG_EMBEDDING_PROVIDER)
+- retrieve_similar() — поиск FAQ: dense (FAISS), lexical (BM25) или hybrid (RRF), см. RAG_RETRIEVAL_MODE
+
+Запуск из командной строки:
+    python -m backend.rag_index build [--incremental]
+    python -m backend.rag_index bench [--size N] [--k K]
 """
 
+import argparse
+import asyncio
+import hashlib
 import json
+import logging
 import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterator, NamedTuple, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка сборки недоступна
+    fcntl = None
 
 import faiss  # type: ignore
+import httpx
 import numpy as np
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
+
+from backend.context_packer import estimate_tokens, pack_context
+from backend.embedding_cache import EmbeddingCache, normalize_text
+from backend.faq_store import FaqStore, store_exists, write_store
+from backend.lexical_index import BM25Index
+from backend.metrics import CallbackMetric, Counter, Histogram, timed
+from backend.singleflight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / "data"
+# RAG_DATA_DIR позволяет держать индекс вне репозитория (бенчмарки, тесты)
+DATA_DIR = Path(os.environ.get("RAG_DATA_DIR") or BASE_DIR / "data")
 FAQS_PATH = DATA_DIR / "faqs.json"
 INDEX_PATH = DATA_DIR / "faiss_index.bin"
-META_PATH = DATA_DIR / "faqs_metadata.npy"
+INDEX_INFO_PATH = DATA_DIR / "faiss_index.json"
+# Векторы и ID flat-индекса float32 в .npy: их можно открыть через mmap (см. _MappedFlatIndex)
+VECTORS_PATH = DATA_DIR / "faiss_index.vectors.npy"
+VECTOR_IDS_PATH = DATA_DIR / "faiss_index.ids.npy"
+LEXICAL_PATH = DATA_DIR / "faqs_lexical.npz"
+BUILD_LOCK_PATH = DATA_DIR / ".build.lock"
+META_PATH = DATA_DIR / "faqs_metadata"  # префикс файлов FaqStore
+LEGACY_META_PATH = DATA_DIR / "faqs_metadata.npy"
+EMBEDDING_CACHE_PATH = DATA_DIR / "embeddings_cache.sqlite3"
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Укороченные эмбеддинги (параметр dimensions моделей text-embedding-3-*); 0 — полная размерность модели
+EMBEDDING_DIMENSIONS = int(os.environ.get("RAG_EMBEDDING_DIMENSIONS") or 0)
+
+# Источник эмбеддингов: openai — API OpenAI, hashing — локальный векторизатор
+# символьных n-грамм (работает без сети, запрос не ждёт ответа API)
+EMBEDDING_PROVIDER = (os.environ.get("RAG_EMBEDDING_PROVIDER") or "openai").lower()
+HASHING_DIM = int(os.environ.get("RAG_HASHING_DIM") or 1024)
+HASHING_NGRAMS = (3, 5)
+
+# Кеш эмбеддингов: LRU в памяти и общий для воркеров SQLite-файл в data/
+EMBEDDING_CACHE_SIZE = int(os.environ.get("RAG_EMBEDDING_CACHE_SIZE") or 2048)
+EMBEDDING_CACHE_DISK = (os.environ.get("RAG_EMBEDDING_CACHE_DISK") or "1") != "0"
+
+# Ограничения на один запрос embeddings.create при построении индекса
+EMBEDDING_BATCH_SIZE = int(os.environ.get("RAG_EMBEDDING_BATCH_SIZE") or 256)
+EMBEDDING_BATCH_MAX_CHARS = int(os.environ.get("RAG_EMBEDDING_BATCH_MAX_CHARS") or 200_000)
+EMBEDDING_CONCURRENCY = int(os.environ.get("RAG_EMBEDDING_CONCURRENCY") or 4)
+EMBEDDING_MAX_RETRIES = int(os.environ.get("RAG_EMBEDDING_MAX_RETRIES") or 5)
+
+# Таймауты этапов обработки запроса пользователя (секунды) и пул HTTP-соединений к OpenAI
+EMBEDDING_TIMEOUT = float(os.environ.get("RAG_EMBEDDING_TIMEOUT") or 10)
+COMPLETION_TIMEOUT = float(os.environ.get("RAG_COMPLETION_TIMEOUT") or 30)
+HTTP_MAX_CONNECTIONS = int(os.environ.get("RAG_HTTP_MAX_CONNECTIONS") or 100)
+HTTP_MAX_KEEPALIVE = int(os.environ.get("RAG_HTTP_MAX_KEEPALIVE") or 20)
+
+# Тип FAISS-индекса: auto | flat | hnsw | ivf. В режиме auto тип выбирается
+# по числу FAQ: точный перебор для небольших баз, HNSW и IVF для крупных
+INDEX_TYPE = (os.environ.get("RAG_INDEX_TYPE") or "auto").lower()
+INDEX_AUTO_HNSW_MIN = int(os.environ.get("RAG_INDEX_AUTO_HNSW_MIN") or 10_000)
+INDEX_AUTO_IVF_MIN = int(os.environ.get("RAG_INDEX_AUTO_IVF_MIN") or 200_000)
+HNSW_M = int(os.environ.get("RAG_HNSW_M") or 32)
+HNSW_EF_CONSTRUCTION = int(os.environ.get("RAG_HNSW_EF_CONSTRUCTION") or 200)
+HNSW_EF_SEARCH = int(os.environ.get("RAG_HNSW_EF_SEARCH") or 64)
+IVF_NLIST = int(os.environ.get("RAG_IVF_NLIST") or 0)  # 0 — подобрать по размеру корпуса
+IVF_NPROBE = int(os.environ.get("RAG_IVF_NPROBE") or 8)
+
+# Компактное хранение векторов в индексе: none — float32, fp16 и int8 — скалярное квантование,
+# pq — product quantization (PQ_M байт на вектор при PQ_NBITS=8). PCA_DIM > 0 — перед индексом
+# векторы проецируются на PCA_DIM главных компонент корпуса. Проекция и квантование
+# сохраняются в файле индекса, поэтому запросы кодируются так же, как FAQ
+INDEX_QUANTIZATION = (os.environ.get("RAG_INDEX_QUANTIZATION") or "none").lower()
+INDEX_PCA_DIM = int(os.environ.get("RAG_INDEX_PCA_DIM") or 0)
+PQ_M = int(os.environ.get("RAG_PQ_M") or 0)  # 0 — один байт на 8 измерений
+PQ_NBITS = int(os.environ.get("RAG_PQ_NBITS") or 8)
+
+# Режим поиска: dense — только FAISS по эмбеддингам OpenAI, lexical — только локальный BM25
+# (без обращения к API эмбеддингов), hybrid — слияние обоих списков через reciprocal rank fusion.
+# В режиме hybrid при недоступности API эмбеддингов поиск продолжает работать по BM25
+RETRIEVAL_MODE = (os.environ.get("RAG_RETRIEVAL_MODE") or "dense").lower()
+RRF_K = int(os.environ.get("RAG_RRF_K") or 60)
+HYBRID_CANDIDATES = int(os.environ.get("RAG_HYBRID_CANDIDATES") or 20)
+
+# Открывать индекс через mmap, чтобы воркеры разделяли страницы файла: flat-индекс float32
+# читается из .npy, у IVF отображаются списки; HNSW и квантованные flat-индексы faiss 1.8 копирует в память
+INDEX_MMAP = (os.environ.get("RAG_INDEX_MMAP") or "1") != "0"
+
+# Прямой ответ без LLM: если лучший FAQ похож на запрос не меньше чем на DIRECT_MIN_SCORE
+# (косинусная близость) и опережает второй результат на DIRECT_MIN_MARGIN, отдаём его ответ как есть
+DIRECT_ANSWER = (os.environ.get("RAG_DIRECT_ANSWER") or "0") != "0"
+DIRECT_MIN_SCORE = float(os.environ.get("RAG_DIRECT_MIN_SCORE") or 0.85)
+DIRECT_MIN_MARGIN = float(os.environ.get("RAG_DIRECT_MIN_MARGIN") or 0.1)
+
+# Контекст промпта: предел top_k от клиента, бюджет токенов на блоки FAQ и предел длины одного ответа.
+# FAQ отбрасываются, если косинусная близость ниже CONTEXT_MIN_SCORE или score ниже доли
+# CONTEXT_RELATIVE_FLOOR от лучшего результата; FAQ с близостью текстов от CONTEXT_DUPLICATE_THRESHOLD — дубли
+TOP_K_MAX = int(os.environ.get("RAG_TOP_K_MAX") or 8)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET") or 1200)
+CONTEXT_MAX_ANSWER_TOKENS = int(os.environ.get("RAG_CONTEXT_MAX_ANSWER_TOKENS") or 300)
+CONTEXT_MIN_SCORE = float(os.environ.get("RAG_CONTEXT_MIN_SCORE") or 0.3)
+CONTEXT_RELATIVE_FLOOR = float(os.environ.get("RAG_CONTEXT_RELATIVE_FLOOR") or 0.6)
+CONTEXT_DUPLICATE_THRESHOLD = float(os.environ.get("RAG_CONTEXT_DUPLICATE_THRESHOLD") or 0.8)
+
+# Сколько запросов к LLM из одного пакета /chat/batch выполняются одновременно
+BATCH_CONCURRENCY = int(os.environ.get("RAG_BATCH_CONCURRENCY") or 4)
+
+# Кеш готовых ответов: размер 0 отключает кеш, порог — косинусная близость
+# эмбеддингов, при которой вопрос считается перефразом уже заданного
+ANSWER_CACHE_SIZE = int(os.environ.get("RAG_ANSWER_CACHE_SIZE") or 512)
+ANSWER_CACHE_TTL = float(os.environ.get("RAG_ANSWER_CACHE_TTL") or 3600)
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD") or 0.95)
 
-_index = None
-_faqs: List[Dict[str, str]] = []
 _dim: int | None = None
+_provider: "EmbeddingProvider | None" = None
 _client: OpenAI | None = None
+_async_client: AsyncOpenAI | None = None
+
+
+class AnswerCache:
+    """
+    LRU-кеш ответов с TTL.
+
+    Ищет ответ сначала по точному совпадению нормализованного запроса,
+    затем по косинусной близости эмбеддинга запроса к уже закешированным.
+    get и get_similar считают только попадания: промах учитывает через miss()
+    вызывающий код, когда ни один из способов не нашёл ответа.
+    """
+
+    def __init__(self, max_size: int, ttl: float, threshold: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[Tuple, Tuple[np.ndarray, Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Dict | None:
+        """Точный поиск по нормализованному запросу."""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            return None
+
+    def get_similar(self, key: Tuple, vector: np.ndarray) -> Dict | None:
+        """Семантический поиск: ближайший закешированный запрос с тем же top_k и версией индекса."""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            best_key, best_score = None, self.threshold
+            for cached_key, (cached_vec, _, expires_at) in list(self._entries.items()):
+                if expires_at <= now:
+                    del self._entries[cached_key]
+                    continue
+                if cached_vec is None or cached_key[1:] != key[1:]:
+                    continue
+                score = float(np.dot(cached_vec, vector))
+                if score >= best_score:
+                    best_key, best_score = cached_key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            return self._entries[best_key][1]
+
+    def miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: Tuple, vector: np.ndarray | None, value: Dict) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (vector, value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+
+class IndexSnapshot(NamedTuple):
+    """
+    Неизменяемый снимок индекса и метаданных FAQ.
+
+    Запрос берёт ссылку на текущий снимок один раз и работает с ней до конца,
+    поэтому перезагрузка подменяет снимок целиком, не блокируя чтение.
+    """
+    index: faiss.Index
+    store: FaqStore
+    info: Dict
+    version: int
+    index_mtime: int
+    lexical: BM25Index | None = None
+
+
+_snapshot: IndexSnapshot | None = None
+_snapshot_lock = threading.Lock()
+_snapshot_version = 0
+_reloader: threading.Thread | None = None
+_reloader_stop = threading.Event()
+
+_answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD)
+_embedding_cache: EmbeddingCache | None = None
+
+# Одинаковые одновременные запросы ждут результат первого вместо своих вызовов OpenAI
+_answer_flight = SingleFlight()
+_answer_modes = {"direct": 0, "llm": 0}
+_answer_modes_lock = threading.Lock()
+_embedding_flight = SingleFlight()
+_async_answer_flight = AsyncSingleFlight()
+_async_embedding_flight = AsyncSingleFlight()
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Длительность этапов ответа чат-бота", ["stage"])
+TOKENS = Counter("rag_openai_tokens_total", "Токены, израсходованные на ответы LLM", ["kind"])
 
 
 def get_client() -> OpenAI:
@@ -36,6 +286,53 @@ def get_client() -> OpenAI:
     return _client
 
 
+def get_async_client() -> AsyncOpenAI:
+    """
+    Создаёт и кеширует асинхронный OpenAI-клиент с общим пулом соединений.
+    Клиент привязан к event loop, в котором впервые используется.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                ),
+            ),
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Закрывает пул соединений асинхронного клиента (при остановке ASGI-приложения)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def reset_after_fork() -> None:
+    """
+    Сбрасывает то, что нельзя делить между процессами после fork: HTTP-клиенты OpenAI
+    (их соединения) и SQLite-соединение кеша эмбеддингов. Индекс и FAQ остаются общими
+    страницами памяти родителя (copy-on-write) и не копируются, пока не изменятся.
+    """
+    global _client, _async_client, _embedding_cache
+    _client = None
+    _async_client = None
+    _embedding_cache = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Создаёт и кеширует кеш эмбеддингов."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        db_path = EMBEDDING_CACHE_PATH if EMBEDDING_CACHE_DISK else None
+        _embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, db_path)
+    return _embedding_cache
+
+
 def load_faqs() -> List[Dict[str, str]]:
     """Загружает FAQ из JSON."""
     DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -69,100 +366,1072 @@ def load_faqs() -> List[Dict[str, str]]:
         return json.load(f)
 
 
-def _build_embeddings(texts: List[str]) -> np.ndarray:
-    """Строит эмбеддинги через OpenAI `text-embedding-3-small`."""
+def _split_batches(texts: List[str]) -> List[List[int]]:
+    """Делит тексты на батчи, ограниченные по количеству и суммарной длине."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    chars = 0
+    for i, text in enumerate(texts):
+        if current and (
+            len(current) >= EMBEDDING_BATCH_SIZE or chars + len(text) > EMBEDDING_BATCH_MAX_CHARS
+        ):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(i)
+        chars += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _request_embeddings(
+    texts: List[str],
+    retries: int = EMBEDDING_MAX_RETRIES,
+    timeout: float | None = None,
+    dimensions: int | None = None,
+) -> np.ndarray:
+    """Один запрос embeddings.create с повторами и экспоненциальной задержкой."""
     client = get_client()
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=texts,
+    options = {"timeout": timeout} if timeout else {}
+    if dimensions:
+        options["dimensions"] = dimensions
+    for attempt in range(retries):
+        try:
+            resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texts, **options)
+            break
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            time.sleep(min(2 ** attempt, 30))
+    data = sorted(resp.data, key=lambda d: d.index)
+    return np.array([d.embedding for d in data], dtype="float32")
+
+
+class EmbeddingProvider:
+    """
+    Источник эмбеддингов для индекса и запросов.
+
+    name, model и dim записываются в faiss_index.json: индекс, построенный
+    другим провайдером, при загрузке пересобирается.
+    """
+
+    name = ""
+    model = ""
+    dim: int | None = None  # None — размерность определяется моделью
+    cacheable = True  # сохранять ли результаты в кеш эмбеддингов
+
+    @property
+    def cache_namespace(self) -> str:
+        """Ключ модели в кеше эмбеддингов: векторы разной размерности не смешиваются."""
+        return self.model
+
+    def embed(self, texts: List[str], **request_options) -> np.ndarray:
+        raise NotImplementedError
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed, texts)
+
+    def describe(self) -> Dict:
+        return {"provider": self.name, "model": self.model}
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Эмбеддинги OpenAI: батчи ограниченного размера, отправляемые параллельно."""
+
+    name = "openai"
+    model = EMBEDDING_MODEL
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dim = dimensions or None
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"{self.model}:{self.dim}" if self.dim else self.model
+
+    def embed(self, texts: List[str], **request_options) -> np.ndarray:
+        if self.dim:
+            request_options["dimensions"] = self.dim
+        batches = _split_batches(texts)
+        if len(batches) == 1:
+            return _request_embeddings(texts, **request_options)
+        with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as pool:
+            results = list(pool.map(
+                lambda batch: _request_embeddings([texts[j] for j in batch], **request_options),
+                batches,
+            ))
+        order = np.argsort(np.concatenate(batches), kind="stable")
+        return np.vstack(results)[order]
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        client = get_async_client()
+        options = {"dimensions": self.dim} if self.dim else {}
+        resp = await asyncio.wait_for(
+            client.embeddings.create(model=self.model, input=texts, timeout=EMBEDDING_TIMEOUT, **options),
+            EMBEDDING_TIMEOUT,
+        )
+        data = sorted(resp.data, key=lambda d: d.index)
+        return np.array([d.embedding for d in data], dtype="float32")
+
+    def describe(self) -> Dict:
+        return {**super().describe(), "dimensions": self.dim} if self.dim else super().describe()
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Локальный векторизатор: символьные n-граммы слов хешируются в вектор
+    фиксированной размерности (со знаком, чтобы коллизии гасили друг друга),
+    частоты сглаживаются логарифмом. Считается на CPU за микросекунды, поэтому не кешируется.
+    """
+
+    name = "hashing"
+    cacheable = False
+
+    def __init__(self, dim: int = HASHING_DIM, ngrams: Tuple[int, int] = HASHING_NGRAMS):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.model = f"char-{ngrams[0]}-{ngrams[1]}gram-{dim}"
+
+    def _grams(self, text: str) -> Iterator[str]:
+        low, high = self.ngrams
+        for word in re.findall(r"\w+", text.lower().replace("ё", "е")):
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                for start in range(max(1, len(padded) - n + 1)):
+                    yield padded[start:start + n]
+
+    def embed(self, texts: List[str], **request_options) -> np.ndarray:
+        rows: List[int] = []
+        hashes: List[int] = []
+        for row, text in enumerate(texts):
+            for gram in self._grams(text):
+                rows.append(row)
+                hashes.append(zlib.crc32(gram.encode("utf-8")))
+
+        matrix = np.zeros((len(texts), self.dim), dtype="float32")
+        if hashes:
+            codes = np.array(hashes, dtype="uint32")
+            signs = np.where(codes >> 31, -1.0, 1.0).astype("float32")
+            np.add.at(matrix, (np.array(rows), codes % self.dim), signs)
+        return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        # Дешевле, чем переключение в поток
+        return self.embed(texts)
+
+    def describe(self) -> Dict:
+        return {**super().describe(), "dim": self.dim}
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Создаёт и кеширует провайдер эмбеддингов по RAG_EMBEDDING_PROVIDER."""
+    global _provider
+    if _provider is None:
+        if EMBEDDING_PROVIDER == "hashing":
+            _provider = HashingEmbeddingProvider()
+        elif EMBEDDING_PROVIDER == "openai":
+            _provider = OpenAIEmbeddingProvider()
+        else:
+            raise ValueError(f"Неизвестный провайдер эмбеддингов: {EMBEDDING_PROVIDER}")
+    return _provider
+
+
+def _embed_texts(texts: List[str], **request_options) -> np.ndarray:
+    """Возвращает эмбеддинги текстов, запрашивая у провайдера только отсутствующие в кеше."""
+    provider = get_embedding_provider()
+    if not provider.cacheable:
+        return provider.embed(texts, **request_options).astype("float32")
+
+    cache = get_embedding_cache()
+    cached = cache.get_many(provider.cache_namespace, texts)
+
+    missing = [i for i, vec in enumerate(cached) if vec is None]
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        fresh = provider.embed(missing_texts, **request_options)
+        cache.put_many(provider.cache_namespace, missing_texts, fresh)
+        for i, vec in zip(missing, fresh):
+            cached[i] = vec
+
+    return np.vstack(cached).astype("float32")
+
+
+def _build_embeddings(texts: List[str]) -> np.ndarray:
+    """Строит эмбеддинги FAQ текущим провайдером."""
+    return _embed_texts(texts)
+
+
+def _faq_text(faq: Dict[str, str]) -> str:
+    return f"Вопрос: {faq['question']}\nОтвет: {faq['answer']}"
+
+
+def _faq_lexical_text(faq: Dict[str, str]) -> str:
+    return f"{faq['question']} {faq['answer']}"
+
+
+def _faq_id(faq: Dict[str, str]) -> int:
+    """Стабильный int64-идентификатор FAQ по хешу вопроса и ответа."""
+    digest = hashlib.sha256(f"{faq['question']}\0{faq['answer']}".encode("utf-8")).hexdigest()
+    return int(digest[:15], 16)
+
+
+def _choose_index_type(size: int) -> str:
+    """Тип индекса из настроек или, в режиме auto, по размеру корпуса."""
+    if INDEX_TYPE in ("flat", "hnsw", "ivf"):
+        return INDEX_TYPE
+    if size >= INDEX_AUTO_IVF_MIN:
+        return "ivf"
+    if size >= INDEX_AUTO_HNSW_MIN:
+        return "hnsw"
+    return "flat"
+
+
+_SCALAR_QUANTIZERS = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def _index_storage(kind: str, size: int, dim: int) -> Dict:
+    """
+    Способ хранения векторов для индекса типа kind на size векторах размерности dim:
+    настройки RAG_INDEX_QUANTIZATION / RAG_INDEX_PCA_DIM, скорректированные под корпус.
+    """
+    pca_dim = INDEX_PCA_DIM if 0 < INDEX_PCA_DIM < dim and size >= INDEX_PCA_DIM else 0
+    if INDEX_PCA_DIM and not pca_dim:
+        logger.warning(
+            f"RAG_INDEX_PCA_DIM={INDEX_PCA_DIM} не меньше размерности эмбеддингов ({dim}) "
+            f"или числа FAQ ({size}), индекс строится без PCA"
+        )
+    quantization = INDEX_QUANTIZATION
+    if quantization not in ("none", "pq", *_SCALAR_QUANTIZERS):
+        raise ValueError(f"Неизвестный способ квантования: {quantization}")
+    # Для обучения кодовых книг PQ нужно хотя бы ~39 векторов на центроид;
+    # HNSW в FAISS хранит PQ-коды только с метрикой L2
+    if quantization == "pq" and (kind == "hnsw" or size < 39 * 2 ** PQ_NBITS):
+        quantization = "int8"
+    return {"quantization": quantization, "pca_dim": pca_dim}
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Число подвекторов PQ: RAG_PQ_M или dim / 8, уменьшенное до делителя dim."""
+    m = min(PQ_M or max(1, dim // 8), dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def _pca_transform(vectors: np.ndarray, pca_dim: int) -> faiss.VectorTransform:
+    """
+    Проекция на pca_dim главных направлений корпуса с последующей нормализацией.
+    Векторы не центрируются, а проекции нормализуются: score — косинусная близость
+    в пространстве проекции, заметно выше, чем у полных векторов, и с порогами
+    RAG_CONTEXT_MIN_SCORE/RAG_DIRECT_MIN_SCORE не сравнивается (см. _search_many).
+    """
+    dim = vectors.shape[1]
+    _, eigenvectors = np.linalg.eigh(vectors.T.astype("float64") @ vectors)
+    projection = faiss.LinearTransform(dim, pca_dim, False)
+    faiss.copy_array_to_vector(
+        np.ascontiguousarray(eigenvectors[:, ::-1][:, :pca_dim].T, dtype="float32").ravel(), projection.A
     )
-    vectors = np.array([d.embedding for d in resp.data], dtype="float32")
-    return vectors
+    projection.is_trained = True
+    return projection
 
 
-def build_index() -> Tuple[faiss.IndexFlatIP, List[Dict[str, str]]]:
-    """Строит FAISS-индекс по FAQ и сохраняет его на диск."""
+def _create_index(
+    kind: str, vectors: np.ndarray, quantization: str = "none", pca_dim: int = 0
+) -> Tuple[faiss.Index, Dict]:
+    """
+    Фабрика индексов. Возвращает пустой обученный индекс с поддержкой add_with_ids
+    и описание его параметров для faiss_index.json.
+    """
+    dim = vectors.shape[1]
+    if pca_dim and not 0 < pca_dim < dim:
+        raise ValueError(f"Размерность PCA ({pca_dim}) должна быть от 1 до {dim - 1} (размерность векторов {dim})")
+    storage = {"quantization": quantization}
+    transforms: List[faiss.VectorTransform] = []
+    if pca_dim:
+        transforms = [_pca_transform(vectors, pca_dim), faiss.NormalizationTransform(pca_dim, 2.0)]
+        for transform in transforms:
+            vectors = transform.apply(vectors)
+        dim = pca_dim
+        storage["pca_dim"] = pca_dim
+    if quantization == "pq":
+        storage.update(pq_m=_pq_subquantizers(dim), pq_nbits=PQ_NBITS)
+
+    if kind == "hnsw":
+        if quantization in _SCALAR_QUANTIZERS:
+            hnsw = faiss.IndexHNSWSQ(dim, _SCALAR_QUANTIZERS[quantization], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            hnsw = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.train(vectors)
+        index, info = faiss.IndexIDMap(hnsw), {"type": "hnsw", "M": HNSW_M, "efConstruction": HNSW_EF_CONSTRUCTION}
+    elif kind == "ivf":
+        # Для обучения k-means нужно хотя бы ~39 векторов на кластер
+        nlist = IVF_NLIST or int(4 * np.sqrt(len(vectors)))
+        nlist = max(1, min(nlist, len(vectors) // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        if quantization == "pq":
+            ivf = faiss.IndexIVFPQ(
+                quantizer, dim, nlist, storage["pq_m"], PQ_NBITS, faiss.METRIC_INNER_PRODUCT
+            )
+        elif quantization in _SCALAR_QUANTIZERS:
+            ivf = faiss.IndexIVFScalarQuantizer(
+                quantizer, dim, nlist, _SCALAR_QUANTIZERS[quantization], faiss.METRIC_INNER_PRODUCT
+            )
+        else:
+            ivf = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        ivf.train(vectors)
+        # IVF хранит ID сам, IndexIDMap для него не нужен
+        index, info = ivf, {"type": "ivf", "nlist": nlist}
+    else:
+        if quantization == "pq":
+            flat = faiss.IndexPQ(dim, storage["pq_m"], PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        elif quantization in _SCALAR_QUANTIZERS:
+            flat = faiss.IndexScalarQuantizer(dim, _SCALAR_QUANTIZERS[quantization], faiss.METRIC_INNER_PRODUCT)
+        else:
+            flat = faiss.IndexFlatIP(dim)
+        flat.train(vectors)
+        index, info = faiss.IndexIDMap(flat), {"type": "flat"}
+
+    if transforms:
+        # Проекция — часть индекса: запрос проходит её внутри search()
+        index = faiss.IndexPreTransform(index)
+        for transform in reversed(transforms):
+            index.prepend_transform(transform)
+    return index, {**info, **storage}
+
+
+def _storage_trained(info: Dict) -> bool:
+    """
+    Проекция PCA и квантование обучаются на корпусе сборки: новые FAQ, добавленные
+    без переобучения, кодируются с большой ошибкой, поэтому такой индекс собирается заново
+    (fp16 обучения не требует, но пересобирается вместе с остальными ради единого правила).
+    """
+    storage = _storage_of(info)
+    return bool(storage["pca_dim"]) or storage["quantization"] != "none"
+
+
+def _storage_of(info: Dict) -> Dict:
+    """Способ хранения векторов из faiss_index.json (у индексов до его появления — float32 без проекции)."""
+    return {"quantization": info.get("quantization", "none"), "pca_dim": info.get("pca_dim", 0)}
+
+
+def _inner_index(index: faiss.Index) -> faiss.Index:
+    """Индекс под обёртками IndexPreTransform и IndexIDMap; живёт, пока жив index."""
+    index = faiss.downcast_index(index)
+    for wrapper in (faiss.IndexPreTransform, faiss.IndexIDMap):
+        if isinstance(index, wrapper):
+            index = faiss.downcast_index(index.index)
+    return index
+
+
+class _MappedFlatIndex:
+    """
+    Точный поиск по скалярному произведению над .npy-файлами, открытыми через mmap.
+
+    faiss 1.8 с IO_FLAG_MMAP всё равно копирует коды flat-индекса в память процесса,
+    а страницы np.load(mmap_mode="r") общие у всех процессов, читающих файл.
+    Реализует нужную поиску часть интерфейса faiss.Index: d, ntotal и search.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray):
+        if len(vectors) != len(ids):
+            raise ValueError(f"Число векторов ({len(vectors)}) не совпадает с числом ID ({len(ids)})")
+        self.vectors = vectors
+        self.ids = ids
+        self.ntotal, self.d = vectors.shape
+
+    @classmethod
+    def load(cls) -> "_MappedFlatIndex":
+        return cls(np.load(VECTORS_PATH, mmap_mode="r"), np.load(VECTOR_IDS_PATH, mmap_mode="r"))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Как faiss.Index.search: (scores, ids) формы (n, k), недостающие места — ID -1."""
+        scores = np.full((len(queries), k), -np.finfo("float32").max, dtype="float32")
+        ids = np.full((len(queries), k), -1, dtype="int64")
+        top = min(k, self.ntotal)
+        if top <= 0:
+            return scores, ids
+        similarity = queries @ self.vectors.T
+        if top < self.ntotal:
+            candidates = np.argpartition(-similarity, top - 1, axis=1)[:, :top]
+        else:
+            candidates = np.broadcast_to(np.arange(self.ntotal), (len(queries), self.ntotal))
+        candidate_scores = np.take_along_axis(similarity, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+        scores[:, :top] = np.take_along_axis(candidate_scores, order, axis=1)
+        ids[:, :top] = self.ids[np.take_along_axis(candidates, order, axis=1)]
+        return scores, ids
+
+
+def _mappable(info: Dict) -> bool:
+    """Индекс — flat без квантования и проекции: его векторы можно хранить в .npy."""
+    return (
+        info.get("type") == "flat"
+        and not info.get("legacy")
+        and _storage_of(info) == {"quantization": "none", "pca_dim": 0}
+    )
+
+
+def _write_flat_vectors(index: faiss.Index, info: Dict) -> None:
+    """Выгружает векторы flat-индекса в .npy для mmap; у остальных индексов удаляет старые файлы."""
+    if not _mappable(info):
+        for path in (VECTORS_PATH, VECTOR_IDS_PATH):
+            path.unlink(missing_ok=True)
+        return
+    vectors = _inner_index(index).reconstruct_n(0, index.ntotal)
+    ids = faiss.vector_to_array(faiss.downcast_index(index).id_map)
+    for path, array in ((VECTORS_PATH, vectors), (VECTOR_IDS_PATH, ids)):
+        _replace_file(path, lambda tmp_path, array=array: _save_npy(tmp_path, array))
+
+
+def _save_npy(path: Path, array: np.ndarray) -> None:
+    # np.save(path) дописал бы к имени временного файла .npy
+    with path.open("wb") as f:
+        np.save(f, array)
+
+
+def _apply_search_params(index: faiss.Index, info: Dict) -> None:
+    """Выставляет параметры поиска, которые не хранятся в файле индекса."""
+    if info.get("type") == "hnsw":
+        _inner_index(index).hnsw.efSearch = HNSW_EF_SEARCH
+    elif info.get("type") == "ivf":
+        faiss.extract_index_ivf(index).nprobe = IVF_NPROBE
+
+
+def _supports_remove(info: Dict) -> bool:
+    return info.get("type") in ("flat", "ivf")
+
+
+def _index_files_exist() -> bool:
+    return INDEX_PATH.exists() and (store_exists(META_PATH) or LEGACY_META_PATH.exists())
+
+
+def _faqs_sha256() -> str:
+    return hashlib.sha256(FAQS_PATH.read_bytes()).hexdigest()
+
+
+def _replace_file(path: Path, write) -> None:
+    """
+    Пишет файл во временный и атомарно подменяет им исходный: процессы,
+    открывшие старую версию через mmap, продолжают читать её без порчи.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _build_lock(shared: bool = False):
+    """Межпроцессная блокировка файлов индекса: эксклюзивная на сборку, разделяемая на чтение."""
+    if fcntl is None:
+        yield
+        return
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with BUILD_LOCK_PATH.open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_index_info() -> Dict:
+    if INDEX_INFO_PATH.exists():
+        return json.loads(INDEX_INFO_PATH.read_text(encoding="utf-8"))
+    # Индексы старого формата (IndexFlatIP без ID) возвращают позицию FAQ
+    return {"type": "flat", "legacy": True}
+
+
+def _embedding_mismatch(info: Dict) -> bool:
+    """Индекс построен другим провайдером/моделью эмбеддингов, чем настроен сейчас."""
+    # Индексы без записи о провайдере строились только через OpenAI
+    stored = info.get("embedding") or OpenAIEmbeddingProvider(dimensions=0).describe()
+    current = get_embedding_provider().describe()
+    if "dim" in current and info.get("dim") not in (None, current["dim"]):
+        return True
+    return (stored.get("provider"), stored.get("model"), stored.get("dimensions")) != (
+        current["provider"], current["model"], current.get("dimensions")
+    )
+
+
+def _read_index_files(mmap: bool = False) -> Tuple[faiss.Index, FaqStore, Dict]:
+    """Читает индекс, метаданные FAQ и описание индекса с диска."""
+    info = _read_index_info()
+
+    if not store_exists(META_PATH):
+        # Миграция с pickled-массива faqs_metadata.npy
+        faqs = list(np.load(LEGACY_META_PATH, allow_pickle=True).tolist())
+        for position, faq in enumerate(faqs):
+            faq.setdefault("id", position)
+        write_store(META_PATH, faqs)
+
+    if mmap and _mappable(info) and VECTORS_PATH.exists() and VECTOR_IDS_PATH.exists():
+        return _MappedFlatIndex.load(), FaqStore(META_PATH), info
+
+    # В faiss 1.8 IO_FLAG_MMAP отображает в память только списки IVF
+    flags = (faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)) if mmap else 0
+    index = faiss.read_index(str(INDEX_PATH), flags)
+    _apply_search_params(index, info)
+    return index, FaqStore(META_PATH), info
+
+
+def _build_index(incremental: bool = False) -> Tuple[faiss.Index, List[Dict[str, str]], Dict]:
+    """
+    Строит индекс и возвращает (index, faqs, stats).
+
+    В инкрементальном режиме переиспользует сохранённый индекс: эмбеддинги
+    считаются только для новых и изменённых FAQ, удалённые FAQ убираются по ID.
+    Если тип индекса сменился, он не умеет удалять векторы (HNSW) или в нём есть
+    PCA или квантование, а FAQ добавились, индекс строится заново —
+    эмбеддинги при этом берутся из кеша.
+    """
     global _dim
+    started = time.perf_counter()
+
+    if not FAQS_PATH.exists():
+        load_faqs()
+    # Хеш считаем до чтения: если файл изменится во время сборки, хеш не совпадёт
+    # и следующая проверка пересоберёт индекс ещё раз
+    faqs_sha256 = _faqs_sha256()
 
-    faqs = load_faqs()
-    texts = [f"Вопрос: {f['question']}\nОтвет: {f['answer']}" for f in faqs]
+    faqs: List[Dict[str, str]] = []
+    seen_ids = set()
+    for faq in load_faqs():
+        faq_id = _faq_id(faq)
+        if faq_id in seen_ids:
+            continue
+        seen_ids.add(faq_id)
+        faqs.append({"question": faq["question"], "answer": faq["answer"], "id": faq_id})
 
-    vectors = _build_embeddings(texts)
-    _dim = vectors.shape[1]
+    kind = _choose_index_type(len(faqs))
+    index = None
+    info: Dict = {}
+    to_add = faqs
+    removed = 0
+    if incremental and _index_files_exist():
+        old_index, old_store, old_info = _read_index_files()
+        old_ids = set(old_store.ids.tolist())
+        old_store.close()
+        stale_ids = old_ids - seen_ids
+        new_faqs = [faq for faq in faqs if faq["id"] not in old_ids]
+        if (
+            not old_info.get("legacy")
+            and not _embedding_mismatch(old_info)
+            and old_info.get("type") == kind
+            and _storage_of(old_info) == _index_storage(kind, len(faqs), old_index.d)
+            and (not new_faqs or not _storage_trained(old_info))
+            and (not stale_ids or _supports_remove(old_info))
+        ):
+            if stale_ids:
+                removed = old_index.remove_ids(np.array(sorted(stale_ids), dtype="int64"))
+            to_add = new_faqs
+            index, info = old_index, old_info
 
-    # Используем cosine similarity через нормализацию и inner product
-    faiss.normalize_L2(vectors)
-    index = faiss.IndexFlatIP(_dim)
-    index.add(vectors)
+    provider = get_embedding_provider()
+    misses_before = get_embedding_cache().misses
+    if to_add:
+        vectors = _build_embeddings([_faq_text(f) for f in to_add])
+        # Используем cosine similarity через нормализацию и inner product
+        faiss.normalize_L2(vectors)
+        if index is not None and index.d != vectors.shape[1]:
+            # Сменилась размерность эмбеддингов — старый индекс не годится
+            return _build_index(incremental=False)
+        if index is None:
+            index, info = _create_index(kind, vectors, **_index_storage(kind, len(vectors), vectors.shape[1]))
+        index.add_with_ids(vectors, np.array([f["id"] for f in to_add], dtype="int64"))
+    elif index is None:
+        raise ValueError("Нет FAQ для построения индекса")
+    _dim = index.d
+    _apply_search_params(index, info)
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    faiss.write_index(index, str(INDEX_PATH))
-    np.save(META_PATH, np.array(faqs, dtype=object))
+    info["dim"] = index.d
+    info["embedding"] = provider.describe()
+    info["faqs_sha256"] = faqs_sha256
+    info.pop("legacy", None)
+    # .npy пишутся раньше файла индекса: по его mtime другие процессы перечитывают снимок
+    _write_flat_vectors(index, info)
+    _replace_file(INDEX_PATH, lambda path: faiss.write_index(index, str(path)))
+    write_store(META_PATH, faqs)
+    BM25Index.build((f["id"], _faq_lexical_text(f)) for f in faqs).save(LEXICAL_PATH)
+    _replace_file(
+        INDEX_INFO_PATH,
+        lambda path: path.write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding="utf-8"),
+    )
+
+    # Ответы, построенные по старому индексу, могут устареть
+    _answer_cache.clear()
+
+    stats = {
+        "total": len(faqs),
+        "added": len(to_add),
+        "removed": int(removed),
+        "embedded": get_embedding_cache().misses - misses_before if provider.cacheable else len(to_add),
+        "index_type": info["type"],
+        "seconds": time.perf_counter() - started,
+    }
+    return index, faqs, stats
+
 
-    return index, faqs
+def build_index(incremental: bool = False) -> Tuple[faiss.Index, FaqStore]:
+    """Строит FAISS-индекс по FAQ и сохраняет его на диск."""
+    with _build_lock():
+        index, _, _ = _build_index(incremental=incremental)
+    return index, FaqStore(META_PATH)
 
 
-def load_index() -> Tuple[faiss.IndexFlatIP, List[Dict[str, str]]]:
+def load_index() -> Tuple[faiss.Index, FaqStore]:
     """Загружает индекс, если он уже построен."""
-    global _dim
+    snapshot = _load_snapshot()
+    return snapshot.index, snapshot.store
+
 
-    if not INDEX_PATH.exists() or not META_PATH.exists():
-        return build_index()
+def _load_snapshot() -> IndexSnapshot:
+    """Читает индекс с диска (при отсутствии — строит) и оборачивает его в новый снимок."""
+    global _dim, _snapshot_version
 
-    index = faiss.read_index(str(INDEX_PATH))
+    if not _index_files_exist():
+        build_index()
+    elif _embedding_mismatch(_read_index_info()):
+        logger.warning("RAG-индекс построен другим провайдером эмбеддингов, пересобираем")
+        build_index()
+
+    with _build_lock(shared=True):
+        index, store, info = _read_index_files(mmap=INDEX_MMAP)
+        index_mtime = INDEX_PATH.stat().st_mtime_ns
+        lexical = _load_lexical(store) if RETRIEVAL_MODE != "dense" else None
     _dim = index.d
-    faqs_arr = np.load(META_PATH, allow_pickle=True)
-    faqs = list(faqs_arr.tolist())
-    return index, faqs
+    _snapshot_version += 1
+    return IndexSnapshot(index, store, info, _snapshot_version, index_mtime, lexical)
+
+
+def _load_lexical(store: FaqStore) -> BM25Index:
+    """Загружает BM25-индекс; для индексов, собранных до его появления, строит по метаданным."""
+    if LEXICAL_PATH.exists():
+        return BM25Index.load(LEXICAL_PATH)
+    lexical = BM25Index.build((faq["id"], _faq_lexical_text(faq)) for faq in store)
+    lexical.save(LEXICAL_PATH)
+    return lexical
+
+
+def snapshot_loaded() -> bool:
+    """Индекс уже загружен в этом процессе (без загрузки)."""
+    return _snapshot is not None
+
+
+def get_snapshot() -> IndexSnapshot:
+    """Текущий снимок индекса; при первом обращении загружает его."""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = _load_snapshot()
+            snapshot = _snapshot
+    return snapshot
 
 
 def ensure_index() -> None:
     """Ленивая инициализация индекса и FAQ."""
-    global _index, _faqs
-    if _index is None or not _faqs:
-        _index, _faqs = load_index()
+    get_snapshot()
 
 
-def retrieve_similar(message: str, top_k: int = 3) -> List[Dict[str, str]]:
-    """Ищет наиболее похожие FAQ по запросу пользователя."""
-    ensure_index()
-    assert _index is not None
+def _needs_rebuild(info: Dict) -> bool:
+    """
+    faqs.json изменился после сборки индекса. У старых индексов без хеша это неизвестно,
+    поэтому они пересобираются один раз — после сборки хеш записывается в faiss_index.json.
+    """
+    if not FAQS_PATH.exists():
+        return False
+    stored = info.get("faqs_sha256")
+    return stored is None or stored != _faqs_sha256()
 
-    client = get_client()
-    # Эмбеддинг запроса
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=[message],
+
+def reload_index(force_rebuild: bool = False) -> Dict:
+    """
+    Перезагружает индекс без перезапуска приложения.
+
+    Если faqs.json изменился с момента сборки (или force_rebuild), индекс
+    инкрементально пересобирается, затем новый снимок атомарно подменяет
+    текущий. Запросы, уже работающие со старым снимком, дочитывают его.
+    """
+    global _snapshot
+
+    with _snapshot_lock:
+        build_stats = None
+        with _build_lock():
+            info = _read_index_info() if INDEX_INFO_PATH.exists() else {}
+            if (
+                force_rebuild
+                or not _index_files_exist()
+                or _needs_rebuild(info)
+                or _embedding_mismatch(info)
+            ):
+                _, _, build_stats = _build_index(incremental=True)
+
+        snapshot = _load_snapshot()
+        _snapshot = snapshot
+        _answer_cache.clear()
+
+    logger.info(f"RAG-индекс перезагружен, версия {snapshot.version}")
+    return {
+        "version": snapshot.version,
+        "total": len(snapshot.store),
+        "index_type": snapshot.info.get("type"),
+        "rebuilt": build_stats is not None,
+        "build": build_stats,
+    }
+
+
+def _watch_index_files(interval: float) -> None:
+    """Фоновый цикл: загружает индекс при старте и следит за faqs.json и файлами индекса."""
+    faqs_mtime = None
+    while not _reloader_stop.is_set():
+        try:
+            snapshot = _snapshot
+            current_faqs_mtime = FAQS_PATH.stat().st_mtime_ns if FAQS_PATH.exists() else 0
+            index_mtime = INDEX_PATH.stat().st_mtime_ns if INDEX_PATH.exists() else 0
+
+            if snapshot is None:
+                get_snapshot()
+            elif (
+                current_faqs_mtime != faqs_mtime
+                # Индекс без хеша пересобирается после правки faqs.json, а не при каждом старте
+                and (faqs_mtime is not None or "faqs_sha256" in snapshot.info)
+                and _needs_rebuild(snapshot.info)
+            ):
+                reload_index()
+            elif index_mtime != snapshot.index_mtime:
+                # Индекс пересобран другим процессом или через CLI
+                reload_index()
+            faqs_mtime = current_faqs_mtime
+        except Exception:
+            logger.exception("Ошибка фоновой перезагрузки RAG-индекса")
+        _reloader_stop.wait(interval)
+
+
+def start_reloader(interval: float = 30.0) -> None:
+    """Запускает фоновый поток перезагрузки индекса (однократно на процесс)."""
+    global _reloader
+    if _reloader is not None and _reloader.is_alive():
+        return
+    _reloader_stop.clear()
+    _reloader = threading.Thread(
+        target=_watch_index_files, args=(interval,), name="rag-index-reloader", daemon=True
+    )
+    _reloader.start()
+
+
+def stop_reloader() -> None:
+    _reloader_stop.set()
+
+
+def _normalize_query(message: str) -> str:
+    """Приводит запрос к каноническому виду для ключа кеша."""
+    text = message.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _embed_query(message: str) -> np.ndarray:
+    """Возвращает нормализованный эмбеддинг запроса формы (1, dim)."""
+    def embed() -> np.ndarray:
+        # На пути запроса пользователя не ждём повторов с задержкой, только таймаут
+        query_vec = _embed_texts([message], retries=1, timeout=EMBEDDING_TIMEOUT)
+        faiss.normalize_L2(query_vec)
+        return query_vec
+
+    model = get_embedding_provider().cache_namespace
+    return _embedding_flight.do((model, normalize_text(message)), embed)
+
+
+async def _aembed_query(message: str) -> np.ndarray:
+    """Асинхронный вариант _embed_query."""
+    provider = get_embedding_provider()
+    if not provider.cacheable:
+        query_vec = (await provider.aembed([message])).astype("float32")
+        faiss.normalize_L2(query_vec)
+        return query_vec
+    return await _async_embedding_flight.do(
+        (provider.cache_namespace, normalize_text(message)), lambda: _aembed_query_uncached(message)
     )
-    query_vec = np.array([resp.data[0].embedding], dtype="float32")
+
+
+async def _aembed_query_uncached(message: str) -> np.ndarray:
+    provider = get_embedding_provider()
+    cache = get_embedding_cache()
+    vector = cache.get_many(provider.cache_namespace, [message])[0]
+    if vector is None:
+        vector = (await provider.aembed([message]))[0]
+        cache.put_many(provider.cache_namespace, [message], vector[None, :])
+    query_vec = np.array([vector], dtype="float32")
     faiss.normalize_L2(query_vec)
+    return query_vec
 
-    scores, indices = _index.search(query_vec, top_k)
-    idxs = indices[0]
 
-    results: List[Dict[str, str]] = []
-    for i, score in zip(idxs, scores[0]):
-        if i < 0:
-            continue
-        faq = _faqs[i]
-        results.append(
-            {
-                "question": faq.get("question", ""),
-                "answer": faq.get("answer", ""),
-                "score": float(score),
-            }
-        )
+async def _aget_snapshot() -> IndexSnapshot:
+    """Текущий снимок индекса; первая загрузка выполняется вне event loop."""
+    snapshot = _snapshot
+    if snapshot is None:
+        snapshot = await asyncio.to_thread(get_snapshot)
+    return snapshot
+
+
+def _query_vector(message: str) -> np.ndarray | None:
+    """
+    Эмбеддинг запроса с учётом режима поиска: в режиме lexical не нужен,
+    в режиме hybrid ошибка API эмбеддингов не прерывает запрос.
+    """
+    if RETRIEVAL_MODE == "lexical":
+        return None
+    if RETRIEVAL_MODE == "hybrid":
+        try:
+            return _embed_query(message)
+        except Exception as e:
+            logger.warning(f"Эмбеддинг запроса недоступен, поиск только по BM25: {e}")
+            return None
+    return _embed_query(message)
+
+
+def _query_vectors(messages: List[str]) -> np.ndarray | None:
+    """Эмбеддинги нескольких запросов (n, dim) одним запросом к провайдеру; режимы — как в _query_vector."""
+    if RETRIEVAL_MODE == "lexical":
+        return None
+    try:
+        # На пути запроса пользователя не ждём повторов с задержкой, только таймаут
+        query_vecs = _embed_texts(messages, retries=1, timeout=EMBEDDING_TIMEOUT)
+    except Exception as e:
+        if RETRIEVAL_MODE != "hybrid":
+            raise
+        logger.warning(f"Эмбеддинги запросов недоступны, поиск только по BM25: {e}")
+        return None
+    faiss.normalize_L2(query_vecs)
+    return query_vecs
+
+
+async def _aquery_vector(message: str) -> np.ndarray | None:
+    """Асинхронный вариант _query_vector."""
+    if RETRIEVAL_MODE == "lexical":
+        return None
+    if RETRIEVAL_MODE == "hybrid":
+        try:
+            return await _aembed_query(message)
+        except Exception as e:
+            logger.warning(f"Эмбеддинг запроса недоступен, поиск только по BM25: {e}")
+            return None
+    return await _aembed_query(message)
+
+
+def _search(
+    message: str, top_k: int, query_vec: np.ndarray | None, snapshot: IndexSnapshot
+) -> List[Dict[str, str]]:
+    """
+    Поиск FAQ по готовому эмбеддингу (если он есть) и/или BM25.
+    Без эмбеддинга ищет только лексически и не обращается к API.
+    """
+    return _search_many([message], top_k, query_vec, snapshot)[0]
+
+
+def _search_many(
+    messages: List[str], top_k: int, query_vecs: np.ndarray | None, snapshot: IndexSnapshot
+) -> List[List[Dict[str, str]]]:
+    """Поиск для нескольких запросов: FAISS получает всю матрицу эмбеддингов (n, dim) одним вызовом."""
+    fuse = query_vecs is not None and snapshot.lexical is not None
+    limit = max(top_k, HYBRID_CANDIDATES) if fuse else top_k
+    # После PCA близость в пространстве проекции завышена и не сравнима с порогами
+    # косинусной близости: прямой ответ и порог контекста для такого индекса отключены
+    calibrated = not snapshot.info.get("pca_dim")
+
+    dense_rows: List[List[Tuple[int, float]]] = [[] for _ in messages]
+    if query_vecs is not None:
+        if query_vecs.shape[1] != snapshot.index.d:
+            raise ValueError(
+                f"Размерность эмбеддинга запроса ({query_vecs.shape[1]}) не совпадает с индексом ({snapshot.index.d})"
+            )
+        scores, indices = snapshot.index.search(query_vecs, limit)
+        dense_rows = [
+            [(int(i), float(score)) for i, score in zip(row_ids, row_scores) if i >= 0]
+            for row_ids, row_scores in zip(indices, scores)
+        ]
+
+    results: List[List[Dict[str, str]]] = []
+    for message, dense in zip(messages, dense_rows):
+        lexical = snapshot.lexical.search(message, limit) if snapshot.lexical is not None else []
+        if fuse:
+            # Reciprocal rank fusion: складываем 1 / (k + ранг) из обоих списков
+            fused: Dict[int, float] = {}
+            for hits in (dense, lexical):
+                for rank, (faq_id, _) in enumerate(hits):
+                    fused[faq_id] = fused.get(faq_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            dense_scores, lexical_scores = (dict(dense) if calibrated else {}), dict(lexical)
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            hits = [
+                (faq_id, score, {"dense_score": dense_scores.get(faq_id), "lexical_score": lexical_scores.get(faq_id)})
+                for faq_id, score in ranked
+            ]
+        else:
+            extra = {} if calibrated or query_vecs is None else {"dense_score": None}
+            hits = [(faq_id, score, extra) for faq_id, score in (dense if query_vecs is not None else lexical)]
+
+        related: List[Dict[str, str]] = []
+        for faq_id, score, extra in hits:
+            faq = snapshot.store.get(faq_id)
+            if faq is None:
+                continue
+            related.append(
+                {
+                    "question": faq.get("question", ""),
+                    "answer": faq.get("answer", ""),
+                    "score": float(score),
+                    **extra,
+                }
+            )
+        results.append(related)
     return results
 
 
-def generate_answer(message: str, top_k: int = 3) -> Dict:
+def retrieve_similar(
+    message: str,
+    top_k: int = 3,
+    query_vec: np.ndarray | None = None,
+    snapshot: IndexSnapshot | None = None,
+) -> List[Dict[str, str]]:
+    """Ищет наиболее похожие FAQ по запросу пользователя."""
+    if snapshot is None:
+        snapshot = get_snapshot()
+
+    # Эмбеддинг запроса
+    if query_vec is None:
+        query_vec = _query_vector(message)
+
+    return _search(message, top_k, query_vec, snapshot)
+
+
+def answer_cache_stats() -> Dict[str, int]:
+    """Статистика кеша ответов: размер, точные и семантические попадания, промахи."""
+    return _answer_cache.stats()
+
+
+def embedding_cache_stats() -> Dict[str, int]:
+    """Статистика кеша эмбеддингов: попадания в память и на диск, промахи."""
+    return get_embedding_cache().stats()
+
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """Сколько вызовов выполнено (leaders) и сколько дождались чужого результата (coalesced)."""
+    return {
+        "answers": _answer_flight.stats(),
+        "embeddings": _embedding_flight.stats(),
+        "async_answers": _async_answer_flight.stats(),
+        "async_embeddings": _async_embedding_flight.stats(),
+    }
+
+
+def answer_mode_stats() -> Dict[str, float]:
+    """Сколько ответов отдано напрямую из FAQ, сколько сгенерировано LLM, и доля прямых."""
+    with _answer_modes_lock:
+        direct, llm = _answer_modes["direct"], _answer_modes["llm"]
+    total = direct + llm
+    return {"direct": direct, "llm": llm, "direct_ratio": direct / total if total else 0.0}
+
+
+def _cache_metrics() -> Dict[Tuple[str, ...], float]:
+    answers = answer_cache_stats()
+    embeddings = embedding_cache_stats()
+    return {
+        ("answer", "hit"): answers["hits"],
+        ("answer", "semantic_hit"): answers["semantic_hits"],
+        ("answer", "miss"): answers["misses"],
+        ("embedding", "memory_hit"): embeddings["memory_hits"],
+        ("embedding", "disk_hit"): embeddings["disk_hits"],
+        ("embedding", "miss"): embeddings["misses"],
+    }
+
+
+CallbackMetric(
+    "rag_cache_lookups_total", "Обращения к кешам ответов и эмбеддингов", _cache_metrics,
+    ["cache", "result"], kind="counter",
+)
+CallbackMetric(
+    "rag_answers_total", "Ответы по способу получения (direct — из FAQ без LLM)",
+    lambda: {(mode,): count for mode, count in _answer_modes.items()}, ["mode"], kind="counter",
+)
+CallbackMetric(
+    "rag_coalesced_requests_total", "Одинаковые одновременные вызовы, дождавшиеся чужого результата",
+    lambda: {(name,): stats["coalesced"] for name, stats in coalescing_stats().items()}, ["call"], kind="counter",
+)
+
+
+def _stage(name: str):
+    """Замер этапа ответа: гистограмма rag_stage_seconds и Server-Timing."""
+    return timed(STAGE_SECONDS, name, stage=name)
+
+
+def _record_usage(usage) -> None:
+    if usage is not None:
+        TOKENS.inc(usage.prompt_tokens, kind="prompt")
+        TOKENS.inc(usage.completion_tokens, kind="completion")
+
+
+def _count_mode(mode: str) -> None:
+    with _answer_modes_lock:
+        _answer_modes[mode] += 1
+
+
+def _dense_score(item: Dict) -> float | None:
+    """Косинусная близость результата поиска (в режиме hybrid score — это RRF, а не близость)."""
+    if "dense_score" in item:
+        return item["dense_score"]
+    return item["score"] if RETRIEVAL_MODE == "dense" else None
+
+
+def _direct_answer(related: List[Dict]) -> str | None:
     """
-    Основная функция для Flask-роута /chat.
-    Возвращает словарь: {answer: str, context: List[FAQ]}.
+    Ответ лучшего FAQ, если он уверенно совпадает с запросом, иначе None.
+    BM25-оценки не нормированы, поэтому без эмбеддинга прямой ответ не используется.
+    Отрыв считается от лучшей близости среди остальных кандидатов; если ни у одного
+    из них близости нет (в hybrid — только BM25-совпадения), отрыв не проверить и прямого ответа нет.
     """
-    ensure_index()
-    related = retrieve_similar(message, top_k=top_k)
+    if not DIRECT_ANSWER or not related:
+        return None
+    best = _dense_score(related[0])
+    if best is None or best < DIRECT_MIN_SCORE:
+        return None
+    others = [score for score in map(_dense_score, related[1:]) if score is not None]
+    if len(related) > 1 and not others:
+        return None
+    if others and best - max(others) < DIRECT_MIN_MARGIN:
+        return None
+    return related[0]["answer"]
+
+
+def _bounded_top_k(top_k: int) -> int:
+    """top_k от клиента в пределах 1..TOP_K_MAX."""
+    return max(1, min(int(top_k), TOP_K_MAX))
+
 
+def _pack_context(related: List[Dict]) -> List[Dict]:
+    """FAQ, которые попадут в промпт: пороги, дубли и бюджет токенов."""
+    return pack_context(
+        related,
+        CONTEXT_TOKEN_BUDGET,
+        min_score=CONTEXT_MIN_SCORE,
+        relative_floor=CONTEXT_RELATIVE_FLOOR,
+        duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD,
+        max_answer_tokens=CONTEXT_MAX_ANSWER_TOKENS,
+        dense_score=_dense_score,
+    )
+
+
+def _prompt_tokens(messages: List[Dict[str, str]], usage=None) -> int:
+    """Токены промпта: по данным API, а если их нет — локальная оценка."""
+    if usage is not None:
+        return usage.prompt_tokens
+    # ~4 служебных токена на каждое сообщение чата
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+
+def _build_messages(message: str, related: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Собирает system/user сообщения для LLM по найденному контексту."""
     context_blocks = [
         f"Вопрос: {item['question']}\nОтвет: {item['answer']}"
         for item in related
@@ -182,21 +1451,444 @@ def generate_answer(message: str, top_k: int = 3) -> Dict:
         "скажи об этом и предложи оставить заявку через форму на сайте."
     )
 
-    client = get_client()
-    completion = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.2,
-        max_tokens=400,
-    )
-    answer = completion.choices[0].message.content.strip()
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _cache_key(message: str, top_k: int, snapshot: IndexSnapshot) -> Tuple:
+    return (_normalize_query(message), top_k, snapshot.version)
+
+
+def _similar_cached(cache_key: Tuple, query_vec: np.ndarray | None) -> Dict | None:
+    """
+    Ответ на похожий запрос из кеша по эмбеддингу (без эмбеддинга — None).
+    Вызывается после промаха точного поиска, поэтому None здесь — окончательный промах кеша.
+    """
+    cached = _answer_cache.get_similar(cache_key, query_vec[0]) if query_vec is not None else None
+    if cached is None:
+        _answer_cache.miss()
+    return cached
+
+
+def _remember(cache_key: Tuple, query_vec: np.ndarray | None, result: Dict) -> Dict:
+    _answer_cache.put(cache_key, query_vec[0] if query_vec is not None else None, result)
+    return result
+
+
+class _AnswerPlan(NamedTuple):
+    """Отобранный контекст и либо прямой ответ из FAQ, либо сообщения для LLM."""
+    context: List[Dict]
+    direct: str | None
+    messages: List[Dict[str, str]]
+
+
+def _plan_answer(message: str, related: List[Dict]) -> _AnswerPlan:
+    """
+    Общая часть синхронных и асинхронных ответов: прямой ответ по порогам score,
+    упаковка контекста и промпт. Асинхронные варианты отличаются только вызовом OpenAI.
+    """
+    direct = _direct_answer(related)
+    with _stage("prompt"):
+        context = _pack_context(related)
+        messages = _build_messages(message, context) if direct is None else []
+    return _AnswerPlan(context, direct, messages)
+
+
+def _retrieve_plan(message: str, top_k: int, query_vec: np.ndarray | None, snapshot: IndexSnapshot) -> _AnswerPlan:
+    with _stage("search"):
+        related = _search(message, top_k, query_vec, snapshot)
+    return _plan_answer(message, related)
+
 
+def _completion_request(plan: _AnswerPlan, stream: bool = False) -> Dict:
+    """Параметры chat.completions.create (одинаковые для OpenAI и AsyncOpenAI)."""
+    request = {
+        "model": "gpt-4.1-mini",
+        "messages": plan.messages,
+        "temperature": 0.2,
+        "max_tokens": 400,
+        "timeout": COMPLETION_TIMEOUT,
+    }
+    if stream:
+        request.update(stream=True, stream_options={"include_usage": True})
+    return request
+
+
+def _direct_result(plan: _AnswerPlan) -> Dict:
+    _count_mode("direct")
+    return {"answer": plan.direct, "context": plan.context, "mode": "direct", "prompt_tokens": 0}
+
+
+def _llm_result(plan: _AnswerPlan, answer: str, usage) -> Dict:
+    _count_mode("llm")
     return {
         "answer": answer,
-        "context": related,
+        "context": plan.context,
+        "mode": "llm",
+        "prompt_tokens": _prompt_tokens(plan.messages, usage),
     }
 
 
+def _completion_result(plan: _AnswerPlan, completion) -> Dict:
+    _record_usage(completion.usage)
+    return _llm_result(plan, completion.choices[0].message.content.strip(), completion.usage)
+
+
+class _StreamCollector:
+    """Собирает потоковый ответ LLM: текст по частям и usage из последнего чанка."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.usage = None
+
+    def feed(self, chunk) -> str | None:
+        """Текст чанка (или None) для события token."""
+        if not chunk.choices:
+            # Последний чанк без choices несёт usage
+            self.usage = chunk.usage
+            _record_usage(self.usage)
+            return None
+        delta = chunk.choices[0].delta.content
+        if delta:
+            self.parts.append(delta)
+        return delta
+
+    def result(self, plan: _AnswerPlan) -> Dict:
+        return _llm_result(plan, "".join(self.parts).strip(), self.usage)
+
+
+def _done_event(result: Dict) -> Tuple[str, Dict]:
+    return "done", {"answer": result["answer"], "mode": result["mode"], "prompt_tokens": result["prompt_tokens"]}
+
+
+def _cached_events(cached: Dict) -> List[Tuple[str, object]]:
+    # Ответ из кеша отдаём одним токеном
+    return [("context", cached["context"]), ("token", cached["answer"]), _done_event(cached)]
+
+
+def _direct_events(cache_key: Tuple, query_vec: np.ndarray | None, plan: _AnswerPlan) -> List[Tuple[str, object]]:
+    result = _remember(cache_key, query_vec, _direct_result(plan))
+    return [("token", result["answer"]), _done_event(result)]
+
+
+def generate_answer(message: str, top_k: int = 3) -> Dict:
+    """
+    Основная функция для Flask-роута /chat.
+    Возвращает словарь: {answer: str, context: List[FAQ], mode: "direct" | "llm", prompt_tokens: int}.
+    top_k ограничен TOP_K_MAX; в контекст попадают только FAQ, прошедшие отбор (_pack_context).
+    """
+    top_k = _bounded_top_k(top_k)
+    with _stage("snapshot"):
+        snapshot = get_snapshot()
+
+    cache_key = _cache_key(message, top_k, snapshot)
+    cached = _answer_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return _answer_flight.do(
+        cache_key, lambda: _generate_answer_uncached(message, top_k, snapshot, cache_key)
+    )
+
+
+def _generate_answer_uncached(message: str, top_k: int, snapshot: IndexSnapshot, cache_key: Tuple) -> Dict:
+    with _stage("embedding"):
+        query_vec = _query_vector(message)
+    cached = _similar_cached(cache_key, query_vec)
+    if cached is not None:
+        return cached
+
+    with _stage("search"):
+        related = _search(message, top_k, query_vec, snapshot)
+    return _remember(cache_key, query_vec, _answer_from_context(message, related))
+
+
+def _answer_from_context(message: str, related: List[Dict]) -> Dict:
+    """Ответ по найденным FAQ: прямой из FAQ или от LLM по упакованному контексту."""
+    plan = _plan_answer(message, related)
+    if plan.direct is not None:
+        return _direct_result(plan)
+    with _stage("completion"):
+        completion = get_client().chat.completions.create(**_completion_request(plan))
+    return _completion_result(plan, completion)
+
+
+def generate_answers(messages: List[str], top_k: int = 3, concurrency: int | None = None) -> List[Dict]:
+    """
+    Пакетный вариант generate_answer для роута /chat/batch.
+    Все запросы, которых нет в кеше, получают эмбеддинги одним запросом к API
+    и ищутся одним вызовом FAISS; запросы к LLM идут параллельно, не больше concurrency
+    (по умолчанию BATCH_CONCURRENCY) одновременно. Возвращает результаты в порядке
+    messages; при ошибке на месте результата — {"error": str}.
+    """
+    top_k = _bounded_top_k(top_k)
+    with _stage("snapshot"):
+        snapshot = get_snapshot()
+
+    results: List[Dict | None] = [None] * len(messages)
+    # Одинаковые запросы внутри пакета обрабатываются один раз
+    pending: Dict[Tuple, List[int]] = {}
+    for i, message in enumerate(messages):
+        cache_key = _cache_key(message, top_k, snapshot)
+        cached = _answer_cache.get(cache_key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(cache_key, []).append(i)
+    if not pending:
+        return results
+
+    keys = list(pending)
+    texts = [messages[pending[key][0]] for key in keys]
+    try:
+        with _stage("embedding"):
+            query_vecs = _query_vectors(texts)
+    except Exception as e:
+        logger.error(f"Ошибка эмбеддинга пакета запросов: {e}")
+        for key in keys:
+            for i in pending[key]:
+                results[i] = {"error": "Ошибка при обработке запроса чат-бота"}
+        return results
+
+    todo: List[int] = []
+    for row, key in enumerate(keys):
+        cached = _similar_cached(key, query_vecs[row:row + 1] if query_vecs is not None else None)
+        if cached is not None:
+            for i in pending[key]:
+                results[i] = cached
+        else:
+            todo.append(row)
+    if not todo:
+        return results
+
+    with _stage("search"):
+        related = _search_many(
+            [texts[row] for row in todo], top_k, query_vecs[todo] if query_vecs is not None else None, snapshot
+        )
+
+    def answer(position: int) -> Dict:
+        row = todo[position]
+        try:
+            result = _answer_from_context(texts[row], related[position])
+        except Exception as e:
+            logger.error(f"Ошибка ответа на запрос из пакета: {e}")
+            return {"error": "Ошибка при обработке запроса чат-бота"}
+        _answer_cache.put(keys[row], query_vecs[row] if query_vecs is not None else None, result)
+        return result
+
+    workers = max(1, min(concurrency or BATCH_CONCURRENCY, len(todo)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-batch") as pool:
+        for position, result in enumerate(pool.map(answer, range(len(todo)))):
+            for i in pending[keys[todo[position]]]:
+                results[i] = result
+    return results
+
+
+def stream_answer(message: str, top_k: int = 3) -> Iterator[Tuple[str, object]]:
+    """
+    Потоковый вариант generate_answer для роута /chat/stream.
+    Отдаёт пары (событие, данные): сначала ("context", List[FAQ]),
+    затем ("token", str) по мере генерации и в конце ("done", {answer: str, mode: str, prompt_tokens: int}).
+    """
+    top_k = _bounded_top_k(top_k)
+    with _stage("snapshot"):
+        snapshot = get_snapshot()
+
+    cache_key = _cache_key(message, top_k, snapshot)
+    cached = _answer_cache.get(cache_key)
+    query_vec = None
+    if cached is None:
+        with _stage("embedding"):
+            query_vec = _query_vector(message)
+        cached = _similar_cached(cache_key, query_vec)
+    if cached is not None:
+        yield from _cached_events(cached)
+        return
+
+    plan = _retrieve_plan(message, top_k, query_vec, snapshot)
+    yield "context", plan.context
+    if plan.direct is not None:
+        yield from _direct_events(cache_key, query_vec, plan)
+        return
+
+    collector = _StreamCollector()
+    with _stage("completion"):
+        for chunk in get_client().chat.completions.create(**_completion_request(plan, stream=True)):
+            delta = collector.feed(chunk)
+            if delta:
+                yield "token", delta
+    yield _done_event(_remember(cache_key, query_vec, collector.result(plan)))
+
+
+async def agenerate_answer(message: str, top_k: int = 3) -> Dict:
+    """
+    Асинхронная версия generate_answer для ASGI-приложения (asgi.py).
+    Не занимает поток на время сетевых запросов к OpenAI.
+    """
+    top_k = _bounded_top_k(top_k)
+    with _stage("snapshot"):
+        snapshot = await _aget_snapshot()
+
+    cache_key = _cache_key(message, top_k, snapshot)
+    cached = _answer_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return await _async_answer_flight.do(
+        cache_key, lambda: _agenerate_answer_uncached(message, top_k, snapshot, cache_key)
+    )
+
+
+async def _agenerate_answer_uncached(
+    message: str, top_k: int, snapshot: IndexSnapshot, cache_key: Tuple
+) -> Dict:
+    with _stage("embedding"):
+        query_vec = await _aquery_vector(message)
+    cached = _similar_cached(cache_key, query_vec)
+    if cached is not None:
+        return cached
+
+    plan = _retrieve_plan(message, top_k, query_vec, snapshot)
+    if plan.direct is not None:
+        return _remember(cache_key, query_vec, _direct_result(plan))
+    with _stage("completion"):
+        completion = await asyncio.wait_for(
+            get_async_client().chat.completions.create(**_completion_request(plan)), COMPLETION_TIMEOUT
+        )
+    return _remember(cache_key, query_vec, _completion_result(plan, completion))
+
+
+async def astream_answer(message: str, top_k: int = 3):
+    """Асинхронная версия stream_answer: асинхронный генератор пар (событие, данные)."""
+    top_k = _bounded_top_k(top_k)
+    with _stage("snapshot"):
+        snapshot = await _aget_snapshot()
+
+    cache_key = _cache_key(message, top_k, snapshot)
+    cached = _answer_cache.get(cache_key)
+    query_vec = None
+    if cached is None:
+        with _stage("embedding"):
+            query_vec = await _aquery_vector(message)
+        cached = _similar_cached(cache_key, query_vec)
+    if cached is not None:
+        for event in _cached_events(cached):
+            yield event
+        return
+
+    plan = _retrieve_plan(message, top_k, query_vec, snapshot)
+    yield "context", plan.context
+    if plan.direct is not None:
+        for event in _direct_events(cache_key, query_vec, plan):
+            yield event
+        return
+
+    collector = _StreamCollector()
+    with _stage("completion"):
+        stream = await asyncio.wait_for(
+            get_async_client().chat.completions.create(**_completion_request(plan, stream=True)),
+            COMPLETION_TIMEOUT,
+        )
+        async for chunk in stream:
+            delta = collector.feed(chunk)
+            if delta:
+                yield "token", delta
+    yield _done_event(_remember(cache_key, query_vec, collector.result(plan)))
+
+
+def _synthetic_vectors(size: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Кластеризованные нормализованные векторы, похожие по структуре на эмбеддинги FAQ."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, size // 50), dim)).astype("float32")
+    labels = rng.integers(0, len(centers), size)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((size, dim)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def benchmark_index_types(
+    vectors: np.ndarray, queries: np.ndarray, k: int = 10, kinds: Tuple[str, ...] = ("flat", "hnsw", "ivf")
+) -> List[Dict]:
+    """
+    Сравнивает типы индексов на одном корпусе: время построения,
+    recall@k относительно точного перебора и задержку одного запроса.
+    """
+    ids = np.arange(len(vectors), dtype="int64")
+    exact = None
+    report = []
+    for kind in kinds:
+        started = time.perf_counter()
+        index, info = _create_index(kind, vectors)
+        index.add_with_ids(vectors, ids)
+        _apply_search_params(index, info)
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        found = np.empty((len(queries), k), dtype="int64")
+        for row, query in enumerate(queries):
+            started = time.perf_counter()
+            _, labels = index.search(query[None, :], k)
+            latencies.append(time.perf_counter() - started)
+            found[row] = labels[0]
+
+        if exact is None:
+            exact_index = faiss.IndexFlatIP(vectors.shape[1])
+            exact_index.add(vectors)
+            _, exact = exact_index.search(queries, k)
+        recall = np.mean([
+            len(set(found[row]) & set(exact[row])) / k for row in range(len(queries))
+        ])
+
+        latencies_ms = np.array(latencies) * 1000
+        report.append({
+            **info,
+            "build_seconds": build_seconds,
+            f"recall@{k}": float(recall),
+            "latency_ms_p50": float(np.percentile(latencies_ms, 50)),
+            "latency_ms_p95": float(np.percentile(latencies_ms, 95)),
+        })
+    return report
+
+
+def main(argv: List[str] | None = None) -> None:
+    """CLI: python -m backend.rag_index build [--incremental] | bench"""
+    parser = argparse.ArgumentParser(prog="python -m backend.rag_index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_cmd = commands.add_parser("build", help="построить FAISS-индекс по data/faqs.json")
+    build_cmd.add_argument(
+        "--incremental",
+        action="store_true",
+        help="пересчитать эмбеддинги только для новых и изменённых FAQ",
+    )
+
+    bench_cmd = commands.add_parser("bench", help="сравнить типы индексов на синтетическом корпусе")
+    bench_cmd.add_argument("--size", type=int, default=20_000, help="размер корпуса")
+    bench_cmd.add_argument("--dim", type=int, default=1536, help="размерность векторов")
+    bench_cmd.add_argument("--queries", type=int, default=200, help="число запросов")
+    bench_cmd.add_argument("--k", type=int, default=10, help="top-k для recall@k")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        with _build_lock():
+            _, _, stats = _build_index(incremental=args.incremental)
+        print(
+            f"FAQ в индексе: {stats['total']} ({stats['index_type']}), добавлено: {stats['added']}, "
+            f"удалено: {stats['removed']}, запрошено эмбеддингов: {stats['embedded']}, "
+            f"время: {stats['seconds']:.2f} с"
+        )
+    elif args.command == "bench":
+        vectors = _synthetic_vectors(args.size, args.dim)
+        # Запросы — зашумлённые копии документов корпуса
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.integers(0, args.size, args.queries)]
+        queries = queries + 0.3 * rng.standard_normal(queries.shape).astype("float32")
+        faiss.normalize_L2(queries)
+        for row in benchmark_index_types(vectors, queries, k=args.k):
+            print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Локальная замена API OpenAI для бенчмарков.
+
+Реализует /v1/embeddings и /v1/chat/completions (в том числе stream=True)
+с настраиваемыми задержками, чтобы нагрузочные тесты не зависели от сети,
+квот и стоимости запросов. Эмбеддинги детерминированы: один и тот же текст
+всегда даёт один и тот же вектор.
+
+Запуск отдельно:
+    python -m benchmarks.fake_openai --port 8100 --embedding-latency 0.05
+"""
+
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import numpy as np
+
+ANSWER = (
+    "Мы разрабатываем веб-приложения, Telegram-ботов и AI-ассистентов. "
+    "Оставьте заявку через форму на сайте, и мы свяжемся с вами."
+)
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Детерминированный нормализованный вектор текста."""
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    vector = rng.standard_normal(dim).astype("float32")
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """HTTP-сервер с параметрами задержек; запросы обрабатываются в отдельных потоках."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        embedding_latency: float = 0.0,
+        completion_latency: float = 0.0,
+        token_latency: float = 0.0,
+        dim: int = 256,
+    ):
+        super().__init__(address, _Handler)
+        self.embedding_latency = embedding_latency
+        self.completion_latency = completion_latency
+        self.token_latency = token_latency
+        self.dim = dim
+        self.requests: Dict[str, int] = {"embeddings": 0, "completions": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, kind: str) -> None:
+        with self._lock:
+            self.requests[kind] += 1
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeOpenAIServer
+
+    def log_message(self, format, *args):  # noqa: A002 — сигнатура BaseHTTPRequestHandler
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/embeddings"):
+            self._embeddings(payload)
+        elif self.path.endswith("/chat/completions"):
+            self._completions(payload)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _send_json(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _embeddings(self, payload: Dict) -> None:
+        self.server.count("embeddings")
+        texts = payload["input"]
+        if isinstance(texts, str):
+            texts = [texts]
+        time.sleep(self.server.embedding_latency)
+        dim = payload.get("dimensions") or self.server.dim
+        tokens = sum(len(t.split()) for t in texts)
+        self._send_json(200, {
+            "object": "list",
+            "model": payload.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, dim)}
+                for i, text in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _completions(self, payload: Dict) -> None:
+        self.server.count("completions")
+        prompt_tokens = sum(len(m["content"].split()) for m in payload["messages"])
+        words = ANSWER.split(" ")
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        }
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": payload.get("model")}
+        time.sleep(self.server.completion_latency)
+
+        if not payload.get("stream"):
+            time.sleep(self.server.token_latency * len(words))
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ANSWER},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, word in enumerate(words):
+            time.sleep(self.server.token_latency)
+            chunk = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        final = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.close_connection = True
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_openai")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="задержка embeddings, с")
+    parser.add_argument("--completion-latency", type=float, default=0.0, help="задержка до первого токена, с")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="задержка на каждый токен, с")
+    parser.add_argument("--dim", type=int, default=256, help="размерность эмбеддингов")
+    args = parser.parse_args(argv)
+
+    server = FakeOpenAIServer(
+        (args.host, args.port),
+        embedding_latency=args.embedding_latency,
+        completion_latency=args.completion_latency,
+        token_latency=args.token_latency,
+        dim=args.dim,
+    )
+    print(f"Fake OpenAI API: {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
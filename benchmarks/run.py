@@ -0,0 +1,716 @@
+"""
+Бенчмарки чат-бота.
+
+    # Нагрузка на /chat: приложение запускается в отдельном процессе против локальной замены OpenAI
+    python -m benchmarks.run chat --server wsgi --concurrency 8 --requests 200 --out chat.json
+
+    # Импорт приложения и время до первого ответа чата с прогревом индекса и без
+    python -m benchmarks.run startup --server wsgi
+
+    # Память воркеров gunicorn: общий индекс, загруженный в мастере, против копии в каждом воркере
+    python -m benchmarks.run memory --workers 4 --faqs 20000
+
+    # Поиск, загрузка и построение индекса на синтетических корпусах (без сети)
+    python -m benchmarks.run micro --sizes 10,1000,10000,100000 --out micro.json
+
+    # Размер, память, задержка поиска и потеря recall компактных индексов против float32 flat
+    python -m benchmarks.run storage --size 100000 --configs none,fp16,int8,pq,pca512+int8
+
+    # Сравнение результатов двух коммитов
+    python -m benchmarks.run compare before.json after.json
+
+Результаты пишутся в JSON вместе с хешем коммита и параметрами запуска.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SERVER_COMMANDS = {
+    "wsgi": ["-m", "flask", "--app", "app", "run", "--host", "127.0.0.1", "--port", "{port}", "--with-threads"],
+    "gunicorn": ["-m", "gunicorn", "--bind", "127.0.0.1:{port}", "wsgi:application"],
+    "asgi": ["-m", "uvicorn", "asgi:application", "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+}
+
+# Слова для синтетических FAQ: корпус должен быть разнообразным, иначе поиск вырождается
+_TOPICS = (
+    "сайт бот магазин crm интеграция оплата доставка поддержка дизайн аналитика сервер "
+    "хостинг домен почта telegram api мобильное приложение лендинг каталог корзина"
+).split()
+_VERBS = "сделать подключить настроить заказать доработать перенести ускорить обновить".split()
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ms = np.array(values) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "max_ms": float(ms.max()),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _write_report(path: str | None, kind: str, args: argparse.Namespace, results) -> None:
+    params = {k: v for k, v in vars(args).items() if k not in ("command", "out")}
+    report = {
+        "benchmark": kind,
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if path:
+        Path(path).write_text(text, encoding="utf-8")
+    print(text)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _questions() -> List[str]:
+    return [faq["question"] for faq in json.loads((BASE_DIR / "data" / "faqs.json").read_text(encoding="utf-8"))]
+
+
+def _app_env(fake: FakeOpenAIServer, workdir: Path, extra_env: Dict[str, str]) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "OPENAI_BASE_URL": fake.base_url,
+        "OPENAI_API_KEY": "benchmark",
+        "RAG_DATA_DIR": str(workdir / "data"),
+        "RAG_RELOAD_INTERVAL": "0",
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.db'}",
+        "CONTACT_SPOOL_DIR": str(workdir / "spool"),
+        **extra_env,
+    }
+
+
+def _start_app(server: str, fake: FakeOpenAIServer, workdir: Path, extra_env: Dict[str, str]):
+    """
+    Запускает приложение против замены OpenAI. Если каталог данных ещё не подготовлен,
+    в него копируется только faqs.json — индекс строится заново, как после деплоя.
+    """
+    data_dir = workdir / "data"
+    if not data_dir.exists():
+        data_dir.mkdir()
+        shutil.copy(BASE_DIR / "data" / "faqs.json", data_dir / "faqs.json")
+    port = _free_port()
+    env = _app_env(fake, workdir, extra_env)
+    command = [sys.executable] + [part.format(port=port) for part in SERVER_COMMANDS[server]]
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return process, port
+
+
+def _stop_app(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _wait_ready(port: int, process: subprocess.Popen, path: str = "/", timeout: float = 60.0) -> None:
+    """Ждёт ответа 200 на GET path."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер приложения завершился с кодом {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Сервер приложения не ответил на {path}")
+
+
+def _chat_request(conn: http.client.HTTPConnection, path: str, message: str, stream: bool) -> Dict:
+    body = json.dumps({"message": message}, ensure_ascii=False).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if stream:
+        headers["Accept"] = "text/event-stream"
+    started = time.perf_counter()
+    conn.request("POST", path, body=body, headers=headers)
+    response = conn.getresponse()
+    first_token = None
+    if stream and response.status == 200:
+        # Время до первого токена — по первому событию token
+        for line in response:
+            if first_token is None and line.startswith(b"event: token"):
+                first_token = time.perf_counter() - started
+    else:
+        response.read()
+    return {"status": response.status, "seconds": time.perf_counter() - started, "first_token": first_token}
+
+
+def run_chat_load(port: int, questions: List[str], args: argparse.Namespace) -> Dict:
+    """Гоняет /chat с заданной параллельностью и собирает задержки и статусы."""
+    path = "/chat/stream" if args.stream else "/chat"
+    counter = itertools.count()
+    local = threading.local()
+    samples: List[Dict] = []
+    lock = threading.Lock()
+
+    def worker() -> None:
+        while True:
+            i = next(counter)
+            if i >= args.requests:
+                return
+            message = questions[i % len(questions)]
+            if not args.repeat:
+                message = f"{message} (вопрос {i})"
+            if getattr(local, "conn", None) is None:
+                local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=args.timeout)
+            try:
+                sample = _chat_request(local.conn, path, message, args.stream)
+            except (OSError, http.client.HTTPException) as e:
+                local.conn.close()
+                local.conn = None
+                sample = {"status": type(e).__name__, "seconds": None, "first_token": None}
+            with lock:
+                samples.append(sample)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+
+    ok = [s for s in samples if s["status"] == 200]
+    statuses: Dict[str, int] = {}
+    for s in samples:
+        statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+    result = {
+        "requests": len(samples),
+        "ok": len(ok),
+        "error_rate": 1 - len(ok) / len(samples) if samples else 0.0,
+        "statuses": statuses,
+        "seconds": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency": _percentiles([s["seconds"] for s in ok]),
+    }
+    if args.stream:
+        result["first_token"] = _percentiles([s["first_token"] for s in ok if s["first_token"] is not None])
+    return result
+
+
+def bench_chat(args: argparse.Namespace) -> Dict:
+    """Запускает замену OpenAI и приложение, прогревает индекс и даёт нагрузку на /chat."""
+    fake = FakeOpenAIServer(
+        ("127.0.0.1", 0),
+        embedding_latency=args.embedding_latency,
+        completion_latency=args.completion_latency,
+        token_latency=args.token_latency,
+        dim=args.dim,
+    )
+    fake.start()
+
+    workdir = Path(tempfile.mkdtemp(prefix="chat-bench-"))
+    questions = _questions()
+    extra_env = {} if args.answer_cache else {"RAG_ANSWER_CACHE_SIZE": "0"}
+    process, port = _start_app(args.server, fake, workdir, extra_env)
+    try:
+        _wait_ready(port, process)
+        # Первый запрос строит индекс — в замеры он не входит
+        warmup = _chat_request(http.client.HTTPConnection("127.0.0.1", port, timeout=120), "/chat", questions[0], False)
+        if warmup["status"] != 200:
+            raise RuntimeError(f"Прогревочный запрос завершился со статусом {warmup['status']}")
+        fake.requests = {"embeddings": 0, "completions": 0}
+        result = run_chat_load(port, questions, args)
+        result["upstream_requests"] = dict(fake.requests)
+        return result
+    finally:
+        _stop_app(process)
+        fake.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_startup(args: argparse.Namespace) -> Dict:
+    """
+    Время импорта app и время до первого ответа чата после запуска — без прогрева
+    (индекс строится первым запросом) и с RAG_PREWARM=1 (первый запрос после /chat/ready).
+    """
+    probe = (
+        "import json, sys, time; started = time.perf_counter(); import {module}; "
+        "print(json.dumps({{'seconds': time.perf_counter() - started, "
+        "'rag_imported': 'backend.rag_index' in sys.modules}}))"
+    ).format(module="asgi" if args.server == "asgi" else "app")
+    imports = [
+        json.loads(subprocess.run(
+            [sys.executable, "-c", probe], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, "RAG_RELOAD_INTERVAL": "0"},
+        ).stdout)
+        for _ in range(args.repeats)
+    ]
+    result: Dict = {
+        "import": {
+            **_percentiles([item["seconds"] for item in imports]),
+            "rag_imported": any(item["rag_imported"] for item in imports),
+        },
+    }
+
+    fake = FakeOpenAIServer(
+        ("127.0.0.1", 0),
+        embedding_latency=args.embedding_latency,
+        completion_latency=args.completion_latency,
+        dim=args.dim,
+    )
+    fake.start()
+    try:
+        for name, prewarm in (("lazy", False), ("prewarm", True)):
+            result[name] = _measure_startup(args.server, fake, prewarm)
+    finally:
+        fake.shutdown()
+    return result
+
+
+def _measure_startup(server: str, fake: FakeOpenAIServer, prewarm: bool) -> Dict:
+    workdir = Path(tempfile.mkdtemp(prefix="startup-bench-"))
+    questions = _questions()
+    started = time.perf_counter()
+    process, port = _start_app(server, fake, workdir, {"RAG_PREWARM": "1" if prewarm else "0"})
+    try:
+        _wait_ready(port, process)
+        result = {"boot_seconds": time.perf_counter() - started}
+        if prewarm:
+            _wait_ready(port, process, path="/chat/ready", timeout=120)
+            result["ready_seconds"] = time.perf_counter() - started
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        first = _chat_request(conn, "/chat", questions[0], False)
+        second = _chat_request(conn, "/chat", questions[1 % len(questions)], False)
+        result.update({
+            "first_chat_seconds": first["seconds"],
+            "warm_chat_seconds": second["seconds"],
+            "statuses": [first["status"], second["status"]],
+        })
+        return result
+    finally:
+        _stop_app(process)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _memory_kb(pid: int) -> Dict[str, int]:
+    """Память процесса из /proc/<pid>/smaps_rollup (Linux), в килобайтах."""
+    fields = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+    result: Dict[str, int] = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        name, _, value = line.partition(":")
+        if name in fields:
+            result[name] = int(value.split()[0])
+    return result
+
+
+def _child_pids(pid: int) -> List[int]:
+    return [int(child) for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+
+
+def bench_memory(args: argparse.Namespace) -> Dict:
+    """
+    Память воркеров gunicorn с индексом на args.faqs синтетических FAQ: без загрузки индекса
+    в мастере (каждый воркер загружает свою копию) и с ней (RAG_PRELOAD=1, общие страницы).
+    PSS делит общие страницы между процессами, поэтому сумма PSS — реальный расход памяти.
+    """
+    fake = FakeOpenAIServer(("127.0.0.1", 0), dim=args.dim)
+    fake.start()
+    questions = [faq["question"] for faq in _synthetic_faqs(args.faqs)[: args.workers * 4]]
+    results: Dict = {}
+    try:
+        for name, preload in (("no_preload", False), ("preload", True)):
+            workdir = Path(tempfile.mkdtemp(prefix="memory-bench-"))
+            extra_env = {
+                "GUNICORN_WORKERS": str(args.workers),
+                "RAG_PRELOAD": "1" if preload else "0",
+                "RAG_EMBEDDING_PROVIDER": "hashing",
+                "RAG_HASHING_DIM": str(args.dim),
+                # mmap делает файл индекса общим и без preload — сравниваем загрузку в память
+                "RAG_INDEX_MMAP": "0",
+            }
+            data_dir = workdir / "data"
+            data_dir.mkdir()
+            (data_dir / "faqs.json").write_text(json.dumps(_synthetic_faqs(args.faqs), ensure_ascii=False), encoding="utf-8")
+            subprocess.run(
+                [sys.executable, "-m", "backend.rag_index", "build"], cwd=BASE_DIR,
+                env=_app_env(fake, workdir, extra_env), check=True, capture_output=True,
+            )
+            process, port = _start_app("gunicorn", fake, workdir, extra_env)
+            try:
+                _wait_ready(port, process)
+                # Параллельные запросы, чтобы индекс загрузил каждый воркер
+                with ThreadPoolExecutor(max_workers=args.workers * 2) as pool:
+                    list(pool.map(
+                        lambda q: _chat_request(http.client.HTTPConnection("127.0.0.1", port, timeout=120), "/chat", q, False),
+                        questions,
+                    ))
+                workers = [_memory_kb(pid) for pid in _child_pids(process.pid)]
+                master = _memory_kb(process.pid)
+                results[name] = {
+                    "master_kb": master,
+                    "workers_kb": workers,
+                    "total_pss_mb": (master["Pss"] + sum(w["Pss"] for w in workers)) / 1024,
+                    "worker_private_mb_mean": float(np.mean([
+                        (w["Private_Clean"] + w["Private_Dirty"]) / 1024 for w in workers
+                    ])),
+                }
+            finally:
+                _stop_app(process)
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        fake.shutdown()
+    return results
+
+
+def _synthetic_faqs(size: int, seed: int = 0) -> List[Dict[str, str]]:
+    rng = np.random.default_rng(seed)
+    faqs = []
+    for i in range(size):
+        verb = _VERBS[rng.integers(len(_VERBS))]
+        topics = " и ".join(rng.choice(_TOPICS, size=2, replace=False))
+        faqs.append({
+            "question": f"Можно ли {verb} {topics} для проекта {i}?",
+            "answer": f"Да, мы можем {verb} {topics}. Срок для проекта {i} — от {rng.integers(1, 12)} недель.",
+        })
+    return faqs
+
+
+def bench_index_size(size: int, queries: int) -> Dict:
+    """Замеры для одного размера корпуса; выполняется в отдельном процессе с RAG_DATA_DIR."""
+    from backend import rag_index
+
+    faqs = _synthetic_faqs(size)
+    rag_index.DATA_DIR.mkdir(parents=True, exist_ok=True)
+    rag_index.FAQS_PATH.write_text(json.dumps(faqs, ensure_ascii=False), encoding="utf-8")
+
+    started = time.perf_counter()
+    rag_index.build_index()
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index, store = rag_index.load_index()
+    load_seconds = time.perf_counter() - started
+    rag_index.get_snapshot()
+
+    rng = np.random.default_rng(1)
+    sample = [faqs[i]["question"] for i in rng.integers(0, size, queries)]
+    retrieve_times = []
+    for question in sample:
+        started = time.perf_counter()
+        rag_index.retrieve_similar(question, top_k=3)
+        retrieve_times.append(time.perf_counter() - started)
+
+    vectors = rag_index._build_embeddings(sample)
+    rag_index.faiss.normalize_L2(vectors)
+    search_times = []
+    for vector in vectors:
+        started = time.perf_counter()
+        index.search(vector[None, :], 3)
+        search_times.append(time.perf_counter() - started)
+
+    return {
+        "size": size,
+        "index_type": rag_index.get_snapshot().info.get("type"),
+        "build_seconds": build_seconds,
+        "load_seconds": load_seconds,
+        "retrieve_similar": _percentiles(retrieve_times),
+        "index_search": _percentiles(search_times),
+    }
+
+
+def bench_micro(args: argparse.Namespace) -> List[Dict]:
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory(prefix="index-bench-") as data_dir:
+            env = {
+                **os.environ,
+                "RAG_DATA_DIR": data_dir,
+                "RAG_EMBEDDING_PROVIDER": "hashing",
+                "RAG_HASHING_DIM": str(args.dim),
+                "RAG_EMBEDDING_CACHE_DISK": "0",
+            }
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "index-size", "--size", str(size), "--queries", str(args.queries)],
+                cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True,
+            )
+            row = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(json.dumps(row, ensure_ascii=False), file=sys.stderr)
+            results.append(row)
+    return results
+
+
+def _storage_spec(spec: str) -> Dict:
+    """Вариант хранения из строки вида none, int8, pq, pca256 или pca256+int8."""
+    storage = {"quantization": "none", "pca_dim": 0}
+    for part in spec.split("+"):
+        if part.startswith("pca"):
+            storage["pca_dim"] = int(part[3:])
+        else:
+            storage["quantization"] = part
+    return storage
+
+
+def _load_vectors(path: str) -> np.ndarray:
+    """Нормализованные векторы из .npy или из flat-индекса float32 (например, data/faiss_index.bin)."""
+    from backend import rag_index
+
+    if path.endswith(".npy"):
+        vectors = np.load(path).astype("float32")
+    else:
+        index = rag_index.faiss.read_index(path)
+        vectors = rag_index._inner_index(index).reconstruct_n(0, index.ntotal)
+    rag_index.faiss.normalize_L2(vectors)
+    return vectors
+
+
+def bench_storage(args: argparse.Namespace) -> List[Dict]:
+    """
+    Компактные варианты индекса: размер файла, прирост RSS при загрузке, задержка одного
+    поиска и recall@k относительно точного поиска по float32. Загрузка и поиск замеряются
+    в отдельном процессе на каждый вариант, чтобы RSS не смешивались.
+
+    Синтетические векторы почти изотропны и сжимаются хуже настоящих эмбеддингов:
+    для оценки потери recall на своих данных передайте --vectors (.npy или flat-индекс float32).
+    """
+    from backend import rag_index
+
+    if args.vectors:
+        vectors = _load_vectors(args.vectors)
+    else:
+        vectors = rag_index._synthetic_vectors(args.size, args.dim)
+    size, dim = vectors.shape
+    # Запросы — зашумлённые копии документов корпуса, как в python -m backend.rag_index bench
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, size, args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype("float32")
+    rag_index.faiss.normalize_L2(queries)
+    exact = rag_index.faiss.IndexFlatIP(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    del exact
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="storage-bench-") as workdir:
+        workdir = Path(workdir)
+        np.save(workdir / "queries.npy", queries)
+        np.save(workdir / "truth.npy", truth)
+        for spec in args.configs.split(","):
+            storage = _storage_spec(spec)
+            if storage["pca_dim"] >= dim:
+                print(f"{spec}: пропущен, PCA не меньше размерности векторов ({dim})", file=sys.stderr)
+                continue
+            started = time.perf_counter()
+            index, info = rag_index._create_index(args.index_type, vectors, **storage)
+            index.add_with_ids(vectors, np.arange(size, dtype="int64"))
+            build_seconds = time.perf_counter() - started
+            index_path = workdir / "index.bin"
+            rag_index.faiss.write_index(index, str(index_path))
+            del index
+
+            completed = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.run", "storage-load", "--index", str(index_path),
+                    "--info", json.dumps(info), "--workdir", str(workdir), "--k", str(args.k),
+                ],
+                cwd=BASE_DIR, capture_output=True, text=True, check=True,
+            )
+            row = {
+                "config": spec,
+                **info,
+                "build_seconds": build_seconds,
+                "index_mb": index_path.stat().st_size / 2 ** 20,
+                **json.loads(completed.stdout.strip().splitlines()[-1]),
+            }
+            print(json.dumps(row, ensure_ascii=False), file=sys.stderr)
+            results.append(row)
+
+    baseline = results[0]
+    for row in results:
+        row["size_ratio"] = baseline["index_mb"] / row["index_mb"]
+        row["recall_loss"] = baseline[f"recall@{args.k}"] - row[f"recall@{args.k}"]
+    return results
+
+
+def bench_storage_load(index_path: str, info: Dict, workdir: Path, k: int) -> Dict:
+    """Загрузка индекса и поиск; выполняется в отдельном процессе (см. bench_storage)."""
+    from backend import rag_index
+
+    queries = np.load(workdir / "queries.npy")
+    truth = np.load(workdir / "truth.npy")
+    rss_before = _memory_kb(os.getpid())["Rss"]
+    index = rag_index.faiss.read_index(index_path)
+    rag_index._apply_search_params(index, info)
+    rss_after = _memory_kb(os.getpid())["Rss"]
+
+    search_times = []
+    found = np.empty((len(queries), k), dtype="int64")
+    for row, query in enumerate(queries):
+        started = time.perf_counter()
+        _, labels = index.search(query[None, :], k)
+        search_times.append(time.perf_counter() - started)
+        found[row] = labels[0]
+    recall = np.mean([len(set(found[row]) & set(truth[row])) / k for row in range(len(queries))])
+    return {
+        "rss_mb": (rss_after - rss_before) / 1024,
+        f"recall@{k}": float(recall),
+        "index_search": _percentiles(search_times),
+    }
+
+
+def _flatten(value, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, list):
+        flat = {}
+        for item in value:
+            # Строки micro-бенчмарка сопоставляются по размеру корпуса, storage — по варианту хранения
+            if isinstance(item, dict) and "size" in item:
+                label = f"size={item['size']}"
+            elif isinstance(item, dict) and "config" in item:
+                label = f"config={item['config']}"
+            else:
+                label = str(len(flat))
+            flat.update(_flatten(item, f"{prefix}[{label}]"))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def compare_reports(before_path: str, after_path: str) -> None:
+    before = json.loads(Path(before_path).read_text(encoding="utf-8"))
+    after = json.loads(Path(after_path).read_text(encoding="utf-8"))
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    old, new = _flatten(before["results"]), _flatten(after["results"])
+    for key in sorted(old.keys() & new.keys()):
+        delta = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        print(f"{key:60} {old[key]:12.3f} {new[key]:12.3f} {delta:>9}")
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    chat_cmd = commands.add_parser("chat", help="нагрузочный тест /chat против локальной замены OpenAI")
+    chat_cmd.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="wsgi")
+    chat_cmd.add_argument("--concurrency", type=int, default=8)
+    chat_cmd.add_argument("--requests", type=int, default=200)
+    chat_cmd.add_argument("--stream", action="store_true", help="запросы к /chat/stream (SSE)")
+    chat_cmd.add_argument("--repeat", action="store_true", help="повторять одни и те же вопросы")
+    chat_cmd.add_argument("--answer-cache", action="store_true", help="не отключать кеш ответов")
+    chat_cmd.add_argument("--embedding-latency", type=float, default=0.05)
+    chat_cmd.add_argument("--completion-latency", type=float, default=0.3)
+    chat_cmd.add_argument("--token-latency", type=float, default=0.01)
+    chat_cmd.add_argument("--dim", type=int, default=256, help="размерность фейковых эмбеддингов")
+    chat_cmd.add_argument("--timeout", type=float, default=60.0)
+    chat_cmd.add_argument("--out", help="файл для JSON-результатов")
+
+    startup_cmd = commands.add_parser("startup", help="импорт app и время до первого ответа чата с прогревом и без")
+    startup_cmd.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="wsgi")
+    startup_cmd.add_argument("--repeats", type=int, default=5, help="сколько раз замерять импорт")
+    startup_cmd.add_argument("--embedding-latency", type=float, default=0.05)
+    startup_cmd.add_argument("--completion-latency", type=float, default=0.3)
+    startup_cmd.add_argument("--dim", type=int, default=256, help="размерность фейковых эмбеддингов")
+    startup_cmd.add_argument("--out", help="файл для JSON-результатов")
+
+    memory_cmd = commands.add_parser("memory", help="память воркеров gunicorn с загрузкой индекса в мастере и без (Linux)")
+    memory_cmd.add_argument("--workers", type=int, default=4)
+    memory_cmd.add_argument("--faqs", type=int, default=20000, help="размер синтетической базы FAQ")
+    memory_cmd.add_argument("--dim", type=int, default=1024, help="размерность локальных эмбеддингов")
+    memory_cmd.add_argument("--out", help="файл для JSON-результатов")
+
+    micro_cmd = commands.add_parser("micro", help="поиск/загрузка/построение индекса на синтетических корпусах")
+    micro_cmd.add_argument("--sizes", default="10,1000,10000,100000")
+    micro_cmd.add_argument("--queries", type=int, default=200)
+    micro_cmd.add_argument("--dim", type=int, default=256, help="размерность локальных эмбеддингов")
+    micro_cmd.add_argument("--out", help="файл для JSON-результатов")
+
+    size_cmd = commands.add_parser("index-size", help="замеры для одного размера корпуса (используется micro)")
+    size_cmd.add_argument("--size", type=int, required=True)
+    size_cmd.add_argument("--queries", type=int, default=200)
+
+    storage_cmd = commands.add_parser("storage", help="компактные индексы (PCA, fp16/int8, PQ) против float32 flat")
+    storage_cmd.add_argument("--size", type=int, default=100_000, help="размер синтетического корпуса")
+    storage_cmd.add_argument("--dim", type=int, default=1536, help="размерность синтетических векторов")
+    storage_cmd.add_argument("--vectors", help="свои векторы вместо синтетических: .npy или flat-индекс float32")
+    storage_cmd.add_argument("--queries", type=int, default=500)
+    storage_cmd.add_argument("--k", type=int, default=10, help="top-k для recall@k")
+    storage_cmd.add_argument("--index-type", choices=("flat", "hnsw", "ivf"), default="flat")
+    storage_cmd.add_argument(
+        "--configs", default="none,fp16,int8,pq,pca512,pca512+int8",
+        help="варианты через запятую; первый — база для size_ratio и recall_loss",
+    )
+    storage_cmd.add_argument("--out", help="файл для JSON-результатов")
+
+    load_cmd = commands.add_parser("storage-load", help="загрузка и поиск одного индекса (используется storage)")
+    load_cmd.add_argument("--index", required=True)
+    load_cmd.add_argument("--info", required=True, help="описание индекса в JSON")
+    load_cmd.add_argument("--workdir", required=True)
+    load_cmd.add_argument("--k", type=int, default=10)
+
+    compare_cmd = commands.add_parser("compare", help="сравнить два JSON-отчёта")
+    compare_cmd.add_argument("before")
+    compare_cmd.add_argument("after")
+
+    args = parser.parse_args(argv)
+    if args.command == "chat":
+        _write_report(args.out, "chat", args, bench_chat(args))
+    elif args.command == "startup":
+        _write_report(args.out, "startup", args, bench_startup(args))
+    elif args.command == "memory":
+        _write_report(args.out, "memory", args, bench_memory(args))
+    elif args.command == "micro":
+        _write_report(args.out, "micro", args, bench_micro(args))
+    elif args.command == "index-size":
+        print(json.dumps(bench_index_size(args.size, args.queries), ensure_ascii=False))
+    elif args.command == "storage":
+        _write_report(args.out, "storage", args, bench_storage(args))
+    elif args.command == "storage-load":
+        print(json.dumps(bench_storage_load(args.index, json.loads(args.info), Path(args.workdir), args.k), ensure_ascii=False))
+    elif args.command == "compare":
+        compare_reports(args.before, args.after)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,23 @@ class Config:
     # Настройки базы данных
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///site.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Пул соединений; для SQLite дополнительно включаются WAL и ожидание блокировки записи (мс)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 10),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT') or 10),
+        'pool_pre_ping': True,
+    }
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)
+
+    # Отложенная пакетная запись заявок: форма ставит заявку в очередь, фоновый поток пишет пакетами.
+    # Журнал (spool) сохраняет заявки из очереди при падении процесса; пустой каталог — instance/contact_spool
+    CONTACT_WRITE_BEHIND = (os.environ.get('CONTACT_WRITE_BEHIND') or '1') != '0'
+    CONTACT_QUEUE_SIZE = int(os.environ.get('CONTACT_QUEUE_SIZE') or 10000)
+    CONTACT_BATCH_SIZE = int(os.environ.get('CONTACT_BATCH_SIZE') or 200)
+    CONTACT_SPOOL = (os.environ.get('CONTACT_SPOOL') or '1') != '0'
+    CONTACT_SPOOL_DIR = os.environ.get('CONTACT_SPOOL_DIR') or ''
+    CONTACT_SPOOL_FSYNC = (os.environ.get('CONTACT_SPOOL_FSYNC') or '1') != '0'
     
     # Настройки сессии
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
@@ -20,3 +37,47 @@ class Config:
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME') or 'admin'
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD') or 'admin'
 
+    # Кеш отрендеренных публичных страниц (главная, кейсы): число страниц и max-age для браузера.
+    # При max-age 0 браузер каждый раз перепроверяет страницу по ETag и получает 304
+    PAGE_CACHE_ENABLED = (os.environ.get('PAGE_CACHE_ENABLED') or '1') != '0'
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE') or 64)
+    PAGE_CACHE_MAX_AGE = int(os.environ.get('PAGE_CACHE_MAX_AGE') or 0)
+
+    # max-age собранной статики (static/dist): имя файла меняется вместе с содержимым,
+    # поэтому браузер может не перепроверять его
+    ASSETS_MAX_AGE = int(os.environ.get('ASSETS_MAX_AGE') or 31536000)
+
+    # Заявок на одной странице админ-панели
+    ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE') or 50)
+    # Сколько заявок читать из БД за раз при экспорте
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+
+    # Интервал (в секундах) проверки faqs.json и файлов индекса чат-бота; 0 — без фоновой перезагрузки
+    RAG_RELOAD_INTERVAL = float(os.environ.get('RAG_RELOAD_INTERVAL') or 30)
+    # Загружать модуль и индекс чат-бота в фоне при старте; без прогрева — при первом запросе к чату
+    RAG_PREWARM = (os.environ.get('RAG_PREWARM') or '0') != '0'
+    # wsgi.py: загружать индекс в мастер-процессе gunicorn до fork воркеров
+    RAG_PRELOAD = (os.environ.get('RAG_PRELOAD') or '1') != '0'
+    # Приложение загружается в мастер-процессе до fork (gunicorn preload_app): фоновые потоки
+    # при импорте не запускаются, их запускает wsgi.after_fork() в каждом воркере
+    DEFER_BACKGROUND_THREADS = (os.environ.get('APP_DEFER_THREADS') or '0') != '0'
+
+    # Контроль допуска запросов к чат-боту: сверх лимита и очереди отвечаем 503 с Retry-After.
+    # Синхронный /chat занимает поток воркера на всё время запроса, поэтому лимиты для него малы
+    CHAT_MAX_CONCURRENT = int(os.environ.get('CHAT_MAX_CONCURRENT') or 4)
+    CHAT_MAX_QUEUE = int(os.environ.get('CHAT_MAX_QUEUE') or 4)
+    # Асинхронный /chat в asgi.py ждёт OpenAI без потока и держит гораздо больше запросов
+    CHAT_ASYNC_MAX_CONCURRENT = int(os.environ.get('CHAT_ASYNC_MAX_CONCURRENT') or 64)
+    CHAT_ASYNC_MAX_QUEUE = int(os.environ.get('CHAT_ASYNC_MAX_QUEUE') or 256)
+    CHAT_QUEUE_TIMEOUT = float(os.environ.get('CHAT_QUEUE_TIMEOUT') or 10)
+    CHAT_RETRY_AFTER = int(os.environ.get('CHAT_RETRY_AFTER') or 5)
+    # Максимум вопросов в одном запросе /chat/batch
+    CHAT_BATCH_MAX_SIZE = int(os.environ.get('CHAT_BATCH_MAX_SIZE') or 32)
+    # Сколько вопросов пакета отвечаются параллельно; каждый занимает слот CHAT_MAX_CONCURRENT
+    RAG_BATCH_CONCURRENCY = int(os.environ.get('RAG_BATCH_CONCURRENCY') or 4)
+
+    # Эндпоинт /metrics в формате Prometheus и заголовок Server-Timing с длительностями этапов ответа.
+    # Метрики видит только вошедший администратор или запрос с заголовком Authorization: Bearer <METRICS_TOKEN>
+    METRICS_ENABLED = (os.environ.get('METRICS_ENABLED') or '1') != '0'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or ''
+    SERVER_TIMING = (os.environ.get('SERVER_TIMING') or '0') != '0'
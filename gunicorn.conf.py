@@ -0,0 +1,45 @@
+"""
+Конфигурация gunicorn для продакшена:
+
+    gunicorn wsgi:application
+
+Воркеров немного (по числу ядер), а потоков в каждом много: /chat почти всё время
+ждёт ответа OpenAI, и поток при этом простаивает, не нагружая CPU. Приложение
+загружается в мастере до fork (preload_app), поэтому индекс чат-бота загружается
+один раз и его страницы памяти общие для всех воркеров.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('GUNICORN_WORKERS') or multiprocessing.cpu_count())
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or 16)
+# Запрос к чату ограничен таймаутами эмбеддинга и генерации (RAG_*_TIMEOUT) — с запасом
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 60)
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+
+# Потоки, запущенные в мастере при загрузке приложения, не переходят в воркеры, а их
+# блокировки (SQLAlchemy, logging) могут остаться захваченными в момент fork
+os.environ.setdefault('APP_DEFER_THREADS', '1' if preload_app else '0')
+
+# Чату отдаём все потоки воркера, кроме нескольких для обычных страниц.
+# Переменная читается config.py при загрузке приложения, которая идёт после этого файла
+os.environ.setdefault('CHAT_MAX_CONCURRENT', str(max(1, threads - 4)))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def when_ready(server):
+    # Объекты, созданные при загрузке приложения, сборщик мусора больше не обходит:
+    # иначе он меняет их заголовки в воркерах и общие страницы копируются
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from wsgi import after_fork
+    after_fork()
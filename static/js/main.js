@@ -237,6 +237,120 @@ function initChatWidget() {
         msg.appendChild(bubble);
         messagesContainer.appendChild(msg);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return bubble;
+    }
+
+    function hideTyping() {
+        if (typingIndicator) {
+            typingIndicator.classList.add('d-none');
+        }
+    }
+
+    /**
+     * Разбирает поток Server-Sent Events и вызывает onEvent(event, data)
+     * для каждого полностью полученного события
+     */
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                onEvent(event, data ? JSON.parse(data) : null);
+            }
+        }
+    }
+
+    async function sendMessageJson(message) {
+        const response = await fetch('/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                message: message,
+                top_k: 3
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error('Network error');
+        }
+
+        const data = await response.json();
+        hideTyping();
+        if (data.error) {
+            appendMessage(data.error, 'bot');
+        } else if (data.answer) {
+            appendMessage(data.answer, 'bot');
+        } else {
+            appendMessage('Не удалось получить ответ от ассистента.', 'bot');
+        }
+    }
+
+    async function sendMessageStream(message) {
+        const response = await fetch('/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify({
+                message: message,
+                top_k: 3
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error('Network error');
+        }
+
+        let bubble = null;
+        let answer = '';
+        let failed = false;
+
+        await readEventStream(response, function(event, data) {
+            if (event === 'token') {
+                if (!bubble) {
+                    hideTyping();
+                    bubble = appendMessage('', 'bot');
+                }
+                answer += data;
+                bubble.textContent = answer;
+                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            } else if (event === 'done') {
+                if (data && data.answer && bubble) {
+                    bubble.textContent = data.answer;
+                }
+            } else if (event === 'error') {
+                hideTyping();
+                appendMessage((data && data.error) || 'Произошла ошибка при обращении к чат-боту.', 'bot');
+                failed = true;
+            }
+        });
+
+        if (!bubble && !failed) {
+            hideTyping();
+            appendMessage('Не удалось получить ответ от ассистента.', 'bot');
+        }
     }
 
     async function sendMessage(message) {
@@ -250,36 +364,17 @@ function initChatWidget() {
         }
 
         try {
-            const response = await fetch('/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    message: message,
-                    top_k: 3
-                })
-            });
-
-            if (!response.ok) {
-                throw new Error('Network error');
-            }
-
-            const data = await response.json();
-            if (data.error) {
-                appendMessage(data.error, 'bot');
-            } else if (data.answer) {
-                appendMessage(data.answer, 'bot');
+            // Потоковый режим требует поддержки ReadableStream в браузере
+            if (window.ReadableStream && window.TextDecoder) {
+                await sendMessageStream(message);
             } else {
-                appendMessage('Не удалось получить ответ от ассистента.', 'bot');
+                await sendMessageJson(message);
             }
         } catch (err) {
             console.error(err);
             appendMessage('Произошла ошибка при обращении к чат-боту.', 'bot');
         } finally {
-            if (typingIndicator) {
-                typingIndicator.classList.add('d-none');
-            }
+            hideTyping();
         }
     }
 
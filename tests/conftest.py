@@ -0,0 +1,42 @@
+"""Общие фикстуры: RAG-индекс во временном каталоге на локальных эмбеддингах."""
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    """Модуль backend.rag_index, настроенный на tmp_path и провайдер hashing (без сети)."""
+    from backend import rag_index
+
+    monkeypatch.setattr(rag_index, 'DATA_DIR', tmp_path)
+    for name in (
+        'FAQS_PATH', 'INDEX_PATH', 'INDEX_INFO_PATH', 'VECTORS_PATH', 'VECTOR_IDS_PATH', 'LEXICAL_PATH',
+        'BUILD_LOCK_PATH', 'META_PATH', 'LEGACY_META_PATH', 'EMBEDDING_CACHE_PATH',
+    ):
+        monkeypatch.setattr(rag_index, name, tmp_path / getattr(rag_index, name).name)
+    monkeypatch.setattr(rag_index, 'EMBEDDING_PROVIDER', 'hashing')
+    monkeypatch.setattr(rag_index, 'EMBEDDING_CACHE_DISK', False)
+    monkeypatch.setattr(rag_index, 'INDEX_TYPE', 'flat')
+    monkeypatch.setattr(rag_index, 'INDEX_QUANTIZATION', 'none')
+    monkeypatch.setattr(rag_index, 'INDEX_PCA_DIM', 0)
+    monkeypatch.setattr(rag_index, 'RETRIEVAL_MODE', 'dense')
+    for name in ('_provider', '_embedding_cache', '_snapshot', '_dim'):
+        monkeypatch.setattr(rag_index, name, None)
+    monkeypatch.setattr(rag_index, '_answer_cache', rag_index.AnswerCache(16, 60, 0.95))
+    yield rag_index
+    if rag_index._snapshot is not None:
+        rag_index._snapshot.store.close()
+
+
+def write_faqs(rag_index, faqs):
+    rag_index.FAQS_PATH.write_text(json.dumps(faqs, ensure_ascii=False), encoding='utf-8')
+
+
+FAQS = [
+    {'question': 'Сколько стоит разработка сайта?', 'answer': 'От 50 000 рублей.'},
+    {'question': 'Делаете ли вы Telegram-ботов?', 'answer': 'Да, на aiogram.'},
+    {'question': 'Как оставить заявку?', 'answer': 'Через форму на странице контактов.'},
+    {'question': 'Есть ли техническая поддержка после запуска?', 'answer': 'Да, по договору сопровождения.'},
+]
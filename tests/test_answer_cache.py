@@ -0,0 +1,68 @@
+"""Кеш ответов: TTL, вытеснение LRU, семантические попадания и учёт промахов."""
+
+import time
+
+import numpy as np
+
+from backend.rag_index import AnswerCache
+from conftest import FAQS, write_faqs
+
+
+def unit(*values):
+    vec = np.array(values, dtype='float32')
+    return vec / np.linalg.norm(vec)
+
+
+def test_exact_hit_and_ttl():
+    cache = AnswerCache(max_size=4, ttl=0.05, threshold=0.9)
+    cache.put(('вопрос', 3, 1), None, {'answer': 'ответ'})
+    assert cache.get(('вопрос', 3, 1)) == {'answer': 'ответ'}
+
+    time.sleep(0.06)
+    assert cache.get(('вопрос', 3, 1)) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_lru_evicts_least_recently_used():
+    cache = AnswerCache(max_size=2, ttl=60, threshold=0.9)
+    cache.put(('a', 3, 1), None, {'answer': 'a'})
+    cache.put(('b', 3, 1), None, {'answer': 'b'})
+    cache.get(('a', 3, 1))
+    cache.put(('c', 3, 1), None, {'answer': 'c'})
+
+    assert cache.get(('b', 3, 1)) is None
+    assert cache.get(('a', 3, 1)) == {'answer': 'a'}
+    assert cache.get(('c', 3, 1)) == {'answer': 'c'}
+
+
+def test_semantic_hit_respects_threshold_top_k_and_version():
+    cache = AnswerCache(max_size=4, ttl=60, threshold=0.9)
+    cache.put(('сколько стоит сайт', 3, 1), unit(1, 0, 0), {'answer': 'цена'})
+
+    assert cache.get_similar(('цена сайта', 3, 1), unit(1, 0.1, 0)) == {'answer': 'цена'}
+    assert cache.get_similar(('цена сайта', 3, 1), unit(1, 1, 0)) is None
+    assert cache.get_similar(('цена сайта', 5, 1), unit(1, 0.1, 0)) is None
+    assert cache.get_similar(('цена сайта', 3, 2), unit(1, 0.1, 0)) is None
+    assert cache.stats()['semantic_hits'] == 1
+    # Промахи учитывает вызывающий код, а не каждый из двух способов поиска
+    assert cache.stats()['misses'] == 0
+
+
+def test_one_hit_or_miss_per_lookup(rag, monkeypatch):
+    # Прямой ответ из FAQ: тест обходится без LLM
+    monkeypatch.setattr(rag, 'DIRECT_ANSWER', True)
+    monkeypatch.setattr(rag, 'DIRECT_MIN_SCORE', 0.5)
+    write_faqs(rag, FAQS)
+    question = FAQS[0]['question']
+
+    first = rag.generate_answer(question)
+    assert first['mode'] == 'direct'
+    assert rag._answer_cache.stats() == {'size': 1, 'hits': 0, 'semantic_hits': 0, 'misses': 1}
+
+    assert rag.generate_answer(question) == first
+    assert rag._answer_cache.stats() == {'size': 1, 'hits': 1, 'semantic_hits': 0, 'misses': 1}
+
+
+def test_lookup_without_embedding_counts_miss(rag):
+    assert rag._similar_cached(('вопрос', 3, 1), None) is None
+    assert rag._answer_cache.stats()['misses'] == 1
@@ -0,0 +1,44 @@
+"""Минификация JS: строки и регулярные выражения не должны портиться."""
+
+import shutil
+import subprocess
+
+import pytest
+
+from backend.assets import STATIC_DIR, minify_css, minify_js
+
+
+@pytest.mark.parametrize('source, kept', [
+    ('function f(x) {\n  return /"/.test(x)\n}\nvar s = "a   b";\n', ['/"/.test(x)', '"a   b"']),
+    ("var t = typeof /'/;\nvar s = 'a   b';\n", ["/'/", "'a   b'"]),
+    ('switch (x) { case /`/.test(y): z = `a   b` }\n', ['/`/.test(y)', '`a   b`']),
+    ('if (a && /[/]"/.test(b)) c = "d   e"\n', ['/[/]"/.test(b)', '"d   e"']),
+    ('throw /x  y/g\n', ['/x  y/g']),
+])
+def test_regex_after_keyword_or_operator(source, kept):
+    minified = minify_js(source)
+    for fragment in kept:
+        assert fragment in minified
+
+
+def test_division_is_not_a_regex():
+    assert minify_js('var q = a.return / 2 / c; var s = "x   y";\n') == 'var q=a.return / 2 / c;var s="x   y";\n'
+    assert minify_js('var r = (a) / 2 / "b   c".length;\n').endswith('"b   c".length;\n')
+
+
+def test_comments_removed_newlines_kept():
+    assert minify_js('var a = 1 // один\n/* два */\nvar b = 2\n') == 'var a=1\nvar b=2\n'
+
+
+def test_css_keeps_strings():
+    assert minify_css('a { content: "x   y" ; /* c */ }') == 'a{content:"x   y"}'
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='нужен node')
+def test_minified_static_js_parses(tmp_path):
+    for source in STATIC_DIR.rglob('*.js'):
+        if 'dist' in source.parts:
+            continue
+        target = tmp_path / source.name
+        target.write_text(minify_js(source.read_text(encoding='utf-8')), encoding='utf-8')
+        subprocess.run(['node', '--check', str(target)], check=True)
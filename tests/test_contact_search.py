@@ -0,0 +1,51 @@
+"""Поиск заявок в админ-панели без учёта регистра, в том числе для кириллицы."""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('CONTACT_WRITE_BEHIND', '0')
+os.environ.setdefault('RAG_RELOAD_INTERVAL', '0')
+
+import pytest
+
+from app import Contact, app, contact_filters_from_args, db, filtered_contacts
+
+
+@pytest.fixture
+def contacts():
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Contact(name='Иван Петров', email='ivan@example.com', phone='+70000000000',
+                    subject='website', message='Хочу сайт для магазина'),
+            Contact(name='John Smith', email='john@example.com', phone='+70000000001',
+                    subject='bot', message='Need a Telegram bot'),
+        ])
+        db.session.commit()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+
+def search(q):
+    return sorted(c.name for c in filtered_contacts(contact_filters_from_args({'q': q})).all())
+
+
+@pytest.mark.parametrize('q', ['Иван', 'иван', 'ИВАН', 'иВаН петров'])
+def test_cyrillic_name_any_case(contacts, q):
+    assert search(q) == ['Иван Петров']
+
+
+@pytest.mark.parametrize('q', ['Сайт', 'САЙТ', 'хочу'])
+def test_cyrillic_message_any_case(contacts, q):
+    assert search(q) == ['Иван Петров']
+
+
+def test_latin_any_case(contacts):
+    assert search('TELEGRAM') == ['John Smith']
+    assert search('EXAMPLE.COM') == ['John Smith', 'Иван Петров']
+
+
+def test_like_wildcards_are_literal(contacts):
+    assert search('%') == []
+    assert search('_') == []
@@ -0,0 +1,105 @@
+"""Отложенная запись заявок: пакеты, журнал и его дочитывание после падения процесса."""
+
+import json
+import threading
+import time
+
+import pytest
+
+from backend.contact_writer import ContactWriter, QueueFull
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'условие не выполнилось вовремя'
+        time.sleep(0.01)
+
+
+def spools(spool_dir):
+    return sorted(spool_dir.glob('contacts-*.jsonl'))
+
+
+def test_batches_and_removes_empty_spool(tmp_path):
+    written = []
+    writer = ContactWriter(written.extend, batch_size=10, spool_dir=tmp_path, fsync=False)
+    for i in range(25):
+        writer.submit({'name': f'Клиент {i}'})
+    assert writer.flush(5)
+    writer.close()
+
+    assert [r['name'] for r in written] == [f'Клиент {i}' for i in range(25)]
+    assert writer.stats()['written'] == 25
+    assert spools(tmp_path) == []
+
+
+def test_queue_full(tmp_path):
+    gate = threading.Event()
+    writer = ContactWriter(lambda records: gate.wait(5), max_queue=1, batch_size=1, fsync=False)
+    writer.submit({'name': 'первая'})
+    wait_for(lambda: writer._queue.empty())  # первая уже в insert_batch
+    writer.submit({'name': 'вторая'})
+    with pytest.raises(QueueFull):
+        writer.submit({'name': 'третья'})
+    gate.set()
+    assert writer.flush(5)
+    writer.close()
+    assert writer.stats()['rejected'] == 1
+
+
+def test_replays_spool_of_crashed_process(tmp_path):
+    # Журнал процесса, упавшего после записи первого пакета: отметка done, затем недописанная строка
+    lines = [
+        {'id': 'a', 'record': {'name': 'записана'}},
+        {'id': 'b', 'record': {'name': 'потеряна 1'}},
+        {'done': ['a']},
+        {'id': 'c', 'record': {'name': 'потеряна 2'}},
+    ]
+    crashed = tmp_path / 'contacts-1-dead0000.jsonl'
+    crashed.write_text(
+        ''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines) + '{"id": "d", "rec',
+        encoding='utf-8',
+    )
+
+    written = []
+    writer = ContactWriter(written.extend, spool_dir=tmp_path, fsync=False)
+    writer.start()
+    wait_for(lambda: not crashed.exists())
+    writer.close()
+
+    assert [r['name'] for r in written] == ['потеряна 1', 'потеряна 2']
+    assert spools(tmp_path) == []
+
+
+def test_done_markers_survive_crash(tmp_path):
+    gate = threading.Event()
+    first = []
+
+    def insert_then_fail(records):
+        if first:
+            raise RuntimeError('БД недоступна')
+        gate.wait(5)
+        first.extend(records)
+
+    writer = ContactWriter(insert_then_fail, batch_size=1, spool_dir=tmp_path, fsync=False)
+    writer.submit({'name': 'первая'})
+    writer.submit({'name': 'вторая'})
+    gate.set()
+    wait_for(lambda: writer.stats()['errors'] >= 1)
+
+    # «Падение»: поток останавливается, не записав вторую заявку, журнал освобождается
+    writer.close(timeout=5)
+    writer._spool.close()
+    (spool,) = spools(tmp_path)
+    entries = [json.loads(line) for line in spool.read_text(encoding='utf-8').splitlines()]
+    assert sum('record' in entry for entry in entries) == 2
+    assert sum('done' in entry for entry in entries) == 1
+
+    replayed = []
+    restarted = ContactWriter(replayed.extend, spool_dir=tmp_path, fsync=False)
+    restarted.start()
+    wait_for(lambda: not spool.exists())
+    restarted.close()
+
+    assert [r['name'] for r in first] == ['первая']
+    assert [r['name'] for r in replayed] == ['вторая']
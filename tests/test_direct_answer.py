@@ -0,0 +1,35 @@
+"""Прямой ответ из FAQ: порог близости и отрыв от остальных кандидатов."""
+
+import pytest
+
+
+@pytest.fixture
+def direct(rag, monkeypatch):
+    monkeypatch.setattr(rag, 'DIRECT_ANSWER', True)
+    monkeypatch.setattr(rag, 'DIRECT_MIN_SCORE', 0.85)
+    monkeypatch.setattr(rag, 'DIRECT_MIN_MARGIN', 0.1)
+    monkeypatch.setattr(rag, 'RETRIEVAL_MODE', 'hybrid')
+    return rag._direct_answer
+
+
+def hit(answer, dense_score, lexical_score=1.0):
+    return {'question': '', 'answer': answer, 'score': 0.03, 'dense_score': dense_score, 'lexical_score': lexical_score}
+
+
+def test_confident_answer(direct):
+    assert direct([hit('да', 0.95), hit('нет', 0.7)]) == 'да'
+    assert direct([hit('да', 0.95)]) == 'да'
+
+
+def test_below_threshold_or_margin(direct):
+    assert direct([hit('да', 0.8), hit('нет', 0.5)]) is None
+    assert direct([hit('да', 0.95), hit('почти да', 0.9)]) is None
+
+
+def test_margin_uses_best_other_candidate(direct):
+    # Второй результат — только BM25, но третий по эмбеддингу почти совпадает с первым
+    assert direct([hit('да', 0.95), hit('bm25', None), hit('почти да', 0.9)]) is None
+
+
+def test_no_dense_runner_up_refuses(direct):
+    assert direct([hit('да', 0.95), hit('bm25', None)]) is None
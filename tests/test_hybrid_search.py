@@ -0,0 +1,73 @@
+"""BM25-поиск и слияние с FAISS через reciprocal rank fusion."""
+
+import faiss
+import numpy as np
+import pytest
+
+from backend.faq_store import FaqStore, write_store
+from backend.lexical_index import BM25Index, tokenize
+
+DOCS = {
+    1: 'Ремонт квартир под ключ',
+    2: 'Доставка пиццы и роллов по городу, доставка цветов, доставка документов курьером в любой район',
+    3: 'Доставка пиццы',
+    4: 'Пицца на заказ',
+}
+
+
+@pytest.fixture
+def bm25():
+    return BM25Index.build(DOCS.items())
+
+
+def test_tokenize_stems_and_drops_stopwords():
+    assert tokenize('Доставка пиццы и Ёлки') == tokenize('доставку пицца елки')
+    assert 'и' not in tokenize('Доставка пиццы и Ёлки')
+
+
+def test_bm25_ranks_by_term_coverage_and_length(bm25):
+    hits = bm25.search('доставка пиццы', 10)
+    assert [doc_id for doc_id, _ in hits] == [3, 2, 4]
+    scores = [score for _, score in hits]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_bm25_top_k_and_no_match(bm25):
+    assert [doc_id for doc_id, _ in bm25.search('доставка пиццы', 1)] == [3]
+    assert bm25.search('бухгалтерия', 5) == []
+    assert bm25.search('и в на', 5) == []
+
+
+def test_bm25_save_load(bm25, tmp_path):
+    bm25.save(tmp_path / 'lexical.npz')
+    loaded = BM25Index.load(tmp_path / 'lexical.npz')
+    assert loaded.search('доставка пиццы', 10) == bm25.search('доставка пиццы', 10)
+
+
+def test_hybrid_rrf_order(rag, bm25, tmp_path, monkeypatch):
+    # Плотный поиск ранжирует 1, 2, 3, 4, лексический — 3, 2, 4 (документа 1 в нём нет)
+    vectors = np.array([[1, 0, 0], [0.9, 0.43, 0], [0.7, 0.71, 0], [0, 0, 1]], dtype='float32')
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(3))
+    index.add_with_ids(vectors, np.array(list(DOCS), dtype='int64'))
+    write_store(tmp_path / 'faqs', [{'id': i, 'question': text, 'answer': str(i)} for i, text in DOCS.items()])
+    store = FaqStore(tmp_path / 'faqs')
+    snapshot = rag.IndexSnapshot(index, store, {'type': 'flat'}, 1, 0, bm25)
+    query_vecs = np.array([[1, 0, 0]], dtype='float32')
+    monkeypatch.setattr(rag, 'RRF_K', 60)
+
+    try:
+        related = rag._search_many(['доставка пиццы'], 4, query_vecs, snapshot)[0]
+        # RRF: 3 = 1/63 + 1/61, 2 = 2/62, 4 = 1/64 + 1/63, 1 = 1/61
+        assert [int(item['answer']) for item in related] == [3, 2, 4, 1]
+        assert related[0]['score'] == pytest.approx(1 / 63 + 1 / 61)
+        assert related[-1]['lexical_score'] is None
+        assert related[-1]['dense_score'] == pytest.approx(1.0)
+
+        assert [int(item['answer']) for item in rag._search_many(['доставка пиццы'], 2, query_vecs, snapshot)[0]] == [3, 2]
+
+        # Без эмбеддинга запроса остаётся BM25
+        lexical_only = rag._search_many(['доставка пиццы'], 4, None, snapshot)[0]
+        assert [int(item['answer']) for item in lexical_only] == [3, 2, 4]
+    finally:
+        store.close()
@@ -0,0 +1,65 @@
+"""Инкрементальная сборка индекса: добавление, изменение и удаление FAQ по стабильным ID."""
+
+import faiss
+import numpy as np
+import pytest
+
+from conftest import FAQS, write_faqs
+
+
+def index_ids(rag):
+    index, store, _ = rag._read_index_files()
+    ids = set(faiss.vector_to_array(faiss.downcast_index(index).id_map).tolist())
+    store_ids = set(store.ids.tolist())
+    store.close()
+    assert ids == store_ids
+    return ids
+
+
+def build(rag, capsys):
+    rag.main(['build', '--incremental'])
+    return capsys.readouterr().out
+
+
+def test_incremental_add_update_remove(rag, capsys):
+    write_faqs(rag, FAQS)
+    assert 'добавлено: 4, удалено: 0' in build(rag, capsys)
+    assert index_ids(rag) == {rag._faq_id(faq) for faq in FAQS}
+
+    added = {'question': 'Работаете ли вы по выходным?', 'answer': 'Нет.'}
+    updated = {**FAQS[1], 'answer': 'Да, на aiogram 3.'}
+    faqs = [FAQS[0], updated, FAQS[3], added]
+    write_faqs(rag, faqs)
+    # FAQS[1] изменён (новый ID вместо старого), FAQS[2] удалён, added — новый
+    assert 'добавлено: 2, удалено: 2' in build(rag, capsys)
+    assert index_ids(rag) == {rag._faq_id(faq) for faq in faqs}
+
+    assert 'добавлено: 0, удалено: 0' in build(rag, capsys)
+
+    top = rag.retrieve_similar(updated['question'], 1)[0]
+    assert top['answer'] == updated['answer']
+
+
+def test_duplicate_faqs_get_one_id(rag, capsys):
+    write_faqs(rag, FAQS + [FAQS[0]])
+    build(rag, capsys)
+    assert len(index_ids(rag)) == len(FAQS)
+
+
+def test_type_change_rebuilds_from_scratch(rag, capsys, monkeypatch):
+    write_faqs(rag, FAQS)
+    build(rag, capsys)
+    monkeypatch.setattr(rag, 'INDEX_TYPE', 'hnsw')
+    assert 'добавлено: 4, удалено: 0' in build(rag, capsys)
+    assert rag._read_index_info()['type'] == 'hnsw'
+    assert index_ids(rag) == {rag._faq_id(faq) for faq in FAQS}
+
+
+def test_pca_not_below_dim(rag, capsys, monkeypatch):
+    with pytest.raises(ValueError, match='PCA'):
+        rag._create_index('flat', np.eye(8, dtype='float32'), pca_dim=8)
+
+    monkeypatch.setattr(rag, 'INDEX_PCA_DIM', rag.HASHING_DIM)
+    write_faqs(rag, FAQS)
+    build(rag, capsys)
+    assert rag._read_index_info().get('pca_dim', 0) == 0
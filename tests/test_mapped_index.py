@@ -0,0 +1,52 @@
+"""Flat-индекс float32 читается из .npy через mmap и ищет так же, как faiss."""
+
+import faiss
+import numpy as np
+
+from conftest import FAQS, write_faqs
+
+
+def test_mapped_search_matches_faiss():
+    from backend.rag_index import _MappedFlatIndex
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 16)).astype('float32')
+    queries = rng.standard_normal((5, 16)).astype('float32')
+    ids = rng.permutation(10_000)[:200].astype('int64')
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(16))
+    index.add_with_ids(vectors, ids)
+
+    mapped = _MappedFlatIndex(vectors, ids)
+    for k in (1, 7, 200, 250):
+        expected_scores, expected_ids = index.search(queries, k)
+        scores, found = mapped.search(queries, k)
+        np.testing.assert_array_equal(found, expected_ids)
+        valid = found >= 0
+        np.testing.assert_allclose(scores[valid], expected_scores[valid], atol=1e-4)
+
+
+def test_flat_index_is_memory_mapped(rag):
+    write_faqs(rag, FAQS)
+    rag.build_index()
+
+    index, store, _ = rag._read_index_files(mmap=True)
+    store.close()
+    assert isinstance(index, rag._MappedFlatIndex)
+    assert isinstance(index.vectors, np.memmap)
+    assert index.ntotal == len(FAQS)
+
+    top = rag.retrieve_similar(FAQS[2]['question'], 1)[0]
+    assert top['answer'] == FAQS[2]['answer']
+
+
+def test_other_index_types_drop_npy(rag, monkeypatch):
+    write_faqs(rag, FAQS)
+    rag.build_index()
+    assert rag.VECTORS_PATH.exists()
+
+    monkeypatch.setattr(rag, 'INDEX_QUANTIZATION', 'int8')
+    rag.build_index()
+    assert not rag.VECTORS_PATH.exists() and not rag.VECTOR_IDS_PATH.exists()
+    index, store, _ = rag._read_index_files(mmap=True)
+    store.close()
+    assert not isinstance(index, rag._MappedFlatIndex)
@@ -0,0 +1,51 @@
+"""Доступ к /metrics: администратор или Bearer-токен METRICS_TOKEN."""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('CONTACT_WRITE_BEHIND', '0')
+os.environ.setdefault('RAG_RELOAD_INTERVAL', '0')
+
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_ENABLED', True)
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'test-token')
+    return app.test_client()
+
+
+def test_anonymous_gets_401(client):
+    response = client.get('/metrics')
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == 'Bearer'
+    assert b'http_request' not in response.data
+
+
+def test_wrong_token_gets_401(client):
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+
+def test_token_grants_access(client):
+    token = app.config['METRICS_TOKEN']
+    response = client.get('/metrics', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+
+
+def test_no_token_configured_only_admin(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', '')
+    assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 401
+
+    with client.session_transaction() as session:
+        session['_user_id'] = 'admin'
+        session['_fresh'] = True
+    assert client.get('/metrics').status_code == 200
+
+
+def test_disabled_is_404(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_ENABLED', False)
+    assert client.get('/metrics').status_code == 404
@@ -0,0 +1,33 @@
+"""Перезагрузка индекса после правки faqs.json, в том числе для индекса без faiss_index.json."""
+
+from conftest import FAQS, write_faqs
+
+
+def test_hashed_index_rebuilds_only_on_change(rag):
+    write_faqs(rag, FAQS)
+    rag.build_index()
+    info = rag._read_index_info()
+    assert not rag._needs_rebuild(info)
+    assert rag.reload_index()['rebuilt'] is False
+
+    write_faqs(rag, FAQS + [{'question': 'Работаете ли вы по выходным?', 'answer': 'Нет.'}])
+    assert rag._needs_rebuild(info)
+    result = rag.reload_index()
+    assert result['rebuilt'] is True
+    assert result['total'] == len(FAQS) + 1
+
+
+def test_index_without_hash_is_rebuilt_once(rag):
+    write_faqs(rag, FAQS)
+    rag.build_index()
+    # Индекс старого формата: описания с хешом faqs.json нет
+    rag.INDEX_INFO_PATH.unlink()
+    write_faqs(rag, FAQS[:3])
+
+    assert rag._needs_rebuild(rag._read_index_info())
+    result = rag.reload_index()
+    assert result['rebuilt'] is True
+    assert result['total'] == 3
+
+    assert 'faqs_sha256' in rag._read_index_info()
+    assert rag.reload_index()['rebuilt'] is False
@@ -0,0 +1,145 @@
+"""Объединение одинаковых одновременных вызовов: результат, ошибки и отмена."""
+
+import asyncio
+import threading
+
+import pytest
+
+from backend.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_threads_share_one_call():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'ответ'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('k', work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('k', work))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    while flight.coalesced < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert results == ['ответ'] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {'leaders': 1, 'coalesced': 3}
+
+
+def test_threads_share_error_and_forget_key():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('сбой')
+
+    errors = []
+
+    def run():
+        try:
+            flight.do('k', fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=run))
+    threads[1].start()
+    while flight.coalesced < 1:
+        threading.Event().wait(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert errors == ['сбой', 'сбой']
+    # После завершения ключ освобождается: следующий вызов выполняется заново
+    assert flight.do('k', lambda: 1) == 1
+
+
+def test_async_coalesces_concurrent_calls():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'ответ'
+
+    async def main():
+        return await asyncio.gather(*(flight.do('k', work) for _ in range(4)))
+
+    assert asyncio.run(main()) == ['ответ'] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {'leaders': 1, 'coalesced': 3}
+
+
+def test_async_error_reaches_every_caller():
+    flight = AsyncSingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError('сбой')
+
+    async def main():
+        return await asyncio.gather(*(flight.do('k', fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [type(r) for r in results] == [RuntimeError] * 3
+
+
+def test_async_leader_cancel_does_not_reach_followers():
+    flight = AsyncSingleFlight()
+    release = None
+
+    async def work():
+        await release.wait()
+        return 'ответ'
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        leader = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        return await follower
+
+    assert asyncio.run(main()) == 'ответ'
+    assert flight.stats() == {'leaders': 1, 'coalesced': 1}
+
+
+def test_async_follower_cancel_does_not_reach_leader():
+    flight = AsyncSingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        return 'ответ'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(main()) == 'ответ'
@@ -0,0 +1,40 @@
+"""
+WSGI-точка входа для продакшена.
+
+    gunicorn wsgi:application            # настройки — в gunicorn.conf.py
+
+create_app() один раз создаёт таблицы БД и загружает индекс чат-бота. С
+preload_app (см. gunicorn.conf.py) это происходит в мастер-процессе до fork,
+и воркеры делят страницы памяти с индексом и FAQ (copy-on-write), а не держат
+каждый свою копию. after_fork() вызывается в каждом воркере после fork.
+"""
+import logging
+
+from app import app, contact_writer, db, init_db
+from backend import chatbot
+
+logger = logging.getLogger(__name__)
+
+
+def create_app():
+    """Подготовка приложения: таблицы БД и индекс чат-бота (без фоновых потоков)"""
+    init_db()
+    if app.config['RAG_PRELOAD']:
+        chatbot.preload()
+    return app
+
+
+def after_fork():
+    """Подготовка воркера: свои соединения с БД и OpenAI, свои фоновые потоки"""
+    with app.app_context():
+        # Соединения из пула мастера не должны использоваться в двух процессах
+        db.engine.dispose(close=False)
+    chatbot.after_fork()
+    if app.config['CONTACT_WRITE_BEHIND']:
+        contact_writer.start()
+    # С RAG_PRELOAD индекс уже загружен в мастере; без него прогрев идёт в каждом воркере
+    if app.config['RAG_PREWARM'] and not app.config['RAG_PRELOAD']:
+        chatbot.start_prewarm()
+
+
+application = create_app()